@@ -0,0 +1,328 @@
+# analytics.py - Cálculo dos payloads do dashboard a partir dos snapshots
+#
+# Funções puras: recebem o rollup diário ou o índice por cliente já carregado
+# (snapshots.py) e aplicam a própria janela de datas. Os handlers em main.py
+# só buscam o snapshot e tratam os fallbacks.
+#
+# NumPy e os módulos de ML (forecasting, segmentation, customers) são
+# importados dentro das funções que os usam: o processo sobe e responde o
+# /health sem carregá-los (o lifespan do main.py os aquece em background).
+from datetime import date, datetime, timedelta
+
+import demographics
+import log
+from metrics import endpoint_fallbacks
+
+DAY_NAMES_SHORT = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+DAY_NAMES = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
+
+# Distribuição semanal usada quando não há dados suficientes
+WEEKLY_PATTERN = [0.8, 0.9, 1.1, 1.2, 1.5, 1.3, 0.6]
+
+
+def _since(days, now=None):
+    return ((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def weekly_pattern(avg_daily):
+    """Receita semanal estimada a partir de uma média diária"""
+    return [
+        {"day": day, "amount": float(avg_daily * factor)}
+        for day, factor in zip(DAY_NAMES_SHORT, WEEKLY_PATTERN)
+    ]
+
+
+def business_stats(rollup, now=None):
+    """Estatísticas gerais do negócio (janela de 30 dias)"""
+    now = now or datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    since = _since(30, now)
+
+    today_appointments = 0
+    total_revenue = 0.0
+    for day, _, _, cell in rollup.cells(since, 'confirmed'):
+        total_revenue += cell.revenue
+        if day == today:
+            today_appointments += cell.count
+
+    return {
+        "todayAppointments": today_appointments,
+        "monthlyRevenue": float(total_revenue),
+        "activeClients": rollup.distinct_customers(since, 'confirmed'),
+        "satisfactionRate": 92.5
+    }
+
+
+def revenue_data(rollup, now=None):
+    """Receita média por dia da semana (janela de 60 dias)"""
+    now = now or datetime.now()
+    since = _since(60, now)
+    # Totais dos confirmados por dia da semana
+    weekdays = rollup.by_weekday(since, 'confirmed')
+    confirmed_count = sum(count for count, _ in weekdays.values())
+    total_confirmed_revenue = sum(revenue for _, revenue in weekdays.values())
+
+    if log.enabled():
+        log.debug("revenue-data: agendamentos na janela",
+                  total=sum(c.count for _, _, _, c in rollup.cells(since)),
+                  confirmed=confirmed_count, revenue=total_confirmed_revenue)
+
+    # Se não há dados suficientes, usar dados realistas baseados no business-stats
+    if confirmed_count < 10:
+        log.info("revenue-data: poucos dados, usando padrão semanal", confirmed=confirmed_count)
+        endpoint_fallbacks.inc(endpoint="revenue-data", reason="no_data")
+        monthly_stats = business_stats(rollup, now)
+        return weekly_pattern(monthly_stats['monthlyRevenue'] / 30)
+
+    # Calcular médias por dia da semana
+    daily_avg = {}
+    for day in range(7):
+        count, revenue = weekdays.get(day, (0, 0.0))
+        if count > 0:
+            daily_avg[day] = revenue / count
+        else:
+            # Se não há dados para esse dia, usar média geral
+            daily_avg[day] = total_confirmed_revenue / confirmed_count
+
+    # Criar dados para os últimos 7 dias
+    revenue = []
+    for i in range(7):
+        day_index = (now.weekday() - i) % 7
+        revenue.append({
+            "day": DAY_NAMES_SHORT[day_index],
+            "amount": float(daily_avg[day_index])
+        })
+
+    log.debug("revenue-data: receita gerada", revenue=revenue)
+    return revenue
+
+
+def service_performance(rollup, now=None):
+    """Top 5 serviços por performance (janela de 60 dias)"""
+    service_stats = {}
+    for _, service, status, cell in rollup.cells(_since(60, now)):
+        if service not in service_stats:
+            service_stats[service] = {
+                'total_revenue': 0,
+                'completed': 0,
+                'total': 0
+            }
+
+        service_stats[service]['total_revenue'] += cell.revenue
+        service_stats[service]['total'] += cell.count
+        if status == 'confirmed':
+            service_stats[service]['completed'] += cell.count
+
+    performance_list = []
+    for service, stats in service_stats.items():
+        completion_rate = (stats['completed'] / stats['total'] * 100) if stats['total'] > 0 else 0
+        revenue_score = min(stats['total_revenue'] / 1000 * 100, 100)
+        performance = (completion_rate * 0.6 + revenue_score * 0.4)
+
+        performance_list.append({
+            "name": service,
+            "performance": float(performance),
+            "revenue": float(stats['total_revenue']),
+            "appointments": stats['total']
+        })
+
+    performance_list.sort(key=lambda x: x['performance'], reverse=True)
+    result = performance_list[:5]
+
+    if log.enabled():
+        log.debug("service-performance: top 5",
+                  total=sum(s['total'] for s in service_stats.values()),
+                  services=len(service_stats), top=[s['name'] for s in result])
+    return result
+
+
+def quick_stats_from_rollup(rollup, now=None):
+    """quick-stats a partir do rollup diário (mesmo resultado da função SQL do pushdown)
+
+    O rollup é atualizado a cada mudança (sincronização ou change feed), então
+    o cálculo só soma as células dos últimos 30 dias.
+    """
+    since = _since(30, now)
+    totals = rollup.window_totals(since)
+    paid = totals['paid']
+    average_ticket = totals['revenue'] / paid if paid else 0
+    hours, services = totals['hours'], totals['services']
+    peak_hour = min(hours, key=lambda hour: (-hours[hour], hour)) if hours else None
+    popular_service = min(services, key=lambda name: (-services[name], name)) if services else None
+    return quick_stats_payload(totals['appointments'], totals['statuses'].get('confirmed', 0),
+                               totals['statuses'].get('canceled', 0), rollup.distinct_customers(since),
+                               average_ticket, peak_hour, popular_service)
+
+
+def quick_stats_payload(total_appointments, confirmed_count, canceled, distinct_customers,
+                        average_ticket, peak_hour, popular_service):
+    """Monta o payload de quick-stats a partir dos totais (locais ou via RPC)"""
+    conversion_rate = (confirmed_count / total_appointments * 100) if total_appointments > 0 else 0
+    cancelation_rate = (canceled / total_appointments * 100) if total_appointments > 0 else 0
+    if peak_hour is None:
+        peak_hour = 14
+    peak_hour_range = f"{peak_hour}:00-{peak_hour+2}:00"
+
+    return {
+        "conversionRate": float(conversion_rate),
+        "cancelationRate": float(cancelation_rate),
+        "newClients": distinct_customers,
+        "averageTicket": float(average_ticket),
+        "peakHour": peak_hour_range,
+        "popularService": popular_service or 'Corte de Cabelo'
+    }
+
+
+def client_demographics(users):
+    """Distribuição demográfica dos usuários com perfil completo (ou None sem dados)"""
+    if not users:
+        log.info("client-demographics: nenhum usuário com perfil completo")
+        return None
+
+    groups = []
+    total_users = len(users)
+
+    # Todas as dimensões numa passada (demographics.py); os cruzamentos padrão
+    # vão na mesma varredura e ficam no cache para a rota de crosstab
+    counts = demographics.count(users, [(field,) for field in demographics.DIMENSIONS] + demographics.CROSSTABS)
+    for field, label in demographics.DIMENSIONS.items():
+        for (value,), count in counts[(field,)].items():
+            groups.append({
+                "group": f"{label}: {value}",
+                "percentage": float(count / total_users * 100),
+                "count": count
+            })
+
+    # Ordenar por porcentagem (maior primeiro) e limitar a 15 categorias
+    groups.sort(key=lambda x: x['percentage'], reverse=True)
+    result = groups[:15]
+
+    log.debug("client-demographics: categorias geradas", users=total_users,
+              categories=len(result), top=[item['group'] for item in result[:5]])
+    return result
+
+
+def ml_insights(rollup, users, now=None):
+    """Insights a partir dos confirmados dos últimos 90 dias"""
+    # Análise de crescimento
+    totals = rollup.daily_totals(_since(90, now), 'confirmed').values()
+    total_revenue = sum(revenue for _, revenue in totals)
+    appointments_count = sum(count for count, _ in totals)
+    return insights_payload(total_revenue, appointments_count, len(users))
+
+
+def insights_payload(total_revenue, appointments_count, client_count, canceled=0):
+    """Monta o payload de insights a partir dos totais (locais ou via RPC)"""
+    avg_daily_appointments = appointments_count / 90
+
+    return {
+        "growthOpportunity": _generate_growth_insight(total_revenue, avg_daily_appointments),
+        "performanceInsight": _generate_performance_insight(appointments_count, client_count),
+        "alerts": _generate_alerts(canceled, appointments_count),
+        "recommendations": _generate_recommendations(total_revenue, client_count)
+    }
+
+
+def client_segmentation(index, users, tenant=None):
+    """Segmentação de clientes a partir do índice por cliente (customers.CustomerIndex)
+
+    Lê e grava o estado dos centróides em disco: chame fora do event loop.
+    """
+    import segmentation
+    from customers import NO_VISITS
+
+    # Preparar dados para clustering
+    today = date.today()
+    client_data = []
+    for user in users:
+        stats = index.get(user.get('email'), NO_VISITS)
+        client_data.append({
+            'user_id': user['id'],
+            'total_spent': stats.spent,
+            'visit_count': stats.visits,
+            'last_visit_days': stats.last_visit_days(today)
+        })
+
+    if len(client_data) < 3:
+        endpoint_fallbacks.inc(endpoint="client-segmentation", reason="no_data")
+        return {"VIP": 2, "Frequente": 5, "Ativo": 8, "Novo": 3}
+
+    # K-means sobre recência, frequência e valor (segmentation.py)
+    return segmentation.segment(client_data, state_path=segmentation.state_path(tenant))
+
+
+def demand_prediction(rollup, now=None):
+    """Previsão de demanda para a próxima semana (ver forecasting.py)"""
+    import forecasting
+    result = forecasting.demand_forecast(rollup, (now or datetime.now()).date())
+    if result is None:
+        # Menos de duas semanas de histórico: média por dia da semana
+        return _weekday_average_prediction(rollup, now)
+
+    revenue = result["revenue"]
+    daily = revenue["daily"]
+    busiest = max(range(len(daily)), key=lambda h: daily[h])
+    low, high = revenue["interval"]
+    payload = {
+        "expectedRevenue": float(revenue["total"]),
+        "busiestDay": DAY_NAMES[(result["start"] + timedelta(days=busiest)).weekday()],
+        "confidence": revenue["confidence"],
+        "revenueInterval": [float(low), float(high)],
+        "model": revenue["model"],
+    }
+    if result["appointments"] is not None:
+        payload["expectedAppointments"] = round(result["appointments"]["total"])
+    return payload
+
+
+def _weekday_average_prediction(rollup, now=None):
+    # Ticket médio por dia da semana
+    daily_avg = {
+        day: revenue / count if count else 0
+        for day, (count, revenue) in rollup.by_weekday(_since(180, now), 'confirmed').items()
+    }
+
+    # Prever próxima semana
+    next_week_prediction = sum(daily_avg.values()) / 7 * 7 if daily_avg else 0
+
+    # Dia mais movimentado
+    busiest_day = max(daily_avg.items(), key=lambda x: x[1])[0] if daily_avg else 4
+
+    return {
+        "expectedRevenue": float(next_week_prediction),
+        "busiestDay": DAY_NAMES[busiest_day],
+        "confidence": 0.85
+    }
+
+
+# Funções auxiliares
+def _generate_growth_insight(revenue, avg_appointments):
+    if revenue > 5000:
+        return "Excelente performance! Considere expandir horários para atender demanda crescente"
+    elif revenue > 2000:
+        return "Bom crescimento. Foco em fidelização pode aumentar receita recorrente"
+    else:
+        return "Oportunidade em marketing digital para captar novos clientes"
+
+
+def _generate_performance_insight(appointments_count, client_count):
+    if appointments_count > 100:
+        return "Alta demanda identificada. Otimize agendamentos para melhor experiência"
+    else:
+        return "Capacidade ociosa disponível. Promova horários com menor ocupação"
+
+
+def _generate_alerts(canceled, appointments_count):
+    cancelation_rate = canceled / appointments_count if appointments_count else 0
+
+    if cancelation_rate > 0.15:
+        return f"ALERTA: Taxa de cancelamento alta ({(cancelation_rate * 100):.0f}%). Reveja política de agendamentos"
+
+    return "Sistema estável. Monitorar satisfação do cliente regularmente"
+
+
+def _generate_recommendations(revenue, client_count):
+    if client_count > 0 and revenue / client_count > 200:
+        return "Clientes de alto valor. Desenvolva programas de fidelidade premium"
+    else:
+        return "Diversifique serviços para aumentar ticket médio"
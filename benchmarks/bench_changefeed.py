@@ -0,0 +1,111 @@
+# bench_changefeed.py - Change feed (webhook) vs polling: frescor e queries
+#
+# Uso:
+#   python benchmarks/bench_changefeed.py [--appointments 100000] [--events 2000]
+#                                         [--batch 50] [--latency 0.02]
+#
+# Faz o papel do Supabase Database Webhook: muda agendamentos no FakeSupabase
+# e envia os eventos para POST /api/ingest/appointments (app em processo,
+# CHANGEFEED_ENABLED=1). Mede a vazão da ingestão, o tempo até quick-stats
+# refletir a mudança e quantas queries foram ao "Supabase" no período, e
+# confere o resultado contra o quick-stats calculado do zero.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault('CHANGEFEED_ENABLED', '1')
+os.environ.setdefault('CHANGEFEED_DEBOUNCE_SECONDS', '0.1')
+os.environ.setdefault('CHANGEFEED_SECRET', 'bench')
+os.environ.setdefault('PRECOMPUTE_ENABLED', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import httpx
+
+import repository
+from fake_supabase import FakeSupabase, synthetic_tables
+
+
+def make_events(appointments, n, now):
+    """Eventos no formato do webhook: novos agendamentos, mudanças de status e remoções"""
+    today = date.today()
+    events = []
+    next_id = max(row['id'] for row in appointments) + 1
+    for i in range(n):
+        kind = random.choice(('INSERT', 'UPDATE', 'UPDATE', 'DELETE'))
+        stamp = (now + timedelta(seconds=i)).isoformat()
+        if kind == 'INSERT' or len(appointments) < 2:
+            row = dict(random.choice(appointments), id=next_id, updated_at=stamp,
+                       date=(today - timedelta(days=random.randrange(30))).isoformat())
+            next_id += 1
+            appointments.append(row)
+            events.append({'type': 'INSERT', 'table': 'appointments', 'record': dict(row), 'old_record': None})
+        elif kind == 'UPDATE':
+            row = random.choice(appointments)
+            old = dict(row)
+            row['status'] = random.choice(('confirmed', 'canceled', 'pending'))
+            row['updated_at'] = stamp
+            events.append({'type': 'UPDATE', 'table': 'appointments', 'record': dict(row), 'old_record': old})
+        else:
+            row = appointments.pop(random.randrange(len(appointments)))
+            events.append({'type': 'DELETE', 'table': 'appointments', 'record': None, 'old_record': row})
+    return events
+
+
+async def run(args):
+    tables = synthetic_tables(args.appointments, max(200, args.appointments // 20), days=args.days)
+    fake = FakeSupabase(tables, latency=args.latency)
+    repository.supabase = fake
+
+    import analytics
+    import main
+    from rollup import DailyRollup
+
+    async with httpx.AsyncClient(app=main.app, base_url='http://bench') as client:
+        started = time.perf_counter()
+        (await client.get('/api/analytics/quick-stats')).raise_for_status()
+        print(f"carga inicial: {time.perf_counter() - started:.2f}s, {fake.query_count} queries")
+
+        events = make_events(tables['appointments'], args.events, datetime.now())
+        queries = fake.query_count
+        started = time.perf_counter()
+        for i in range(0, len(events), args.batch):
+            (await client.post('/api/ingest/appointments', json=events[i:i + args.batch],
+                               headers={'X-Webhook-Secret': os.environ['CHANGEFEED_SECRET']})).raise_for_status()
+        ingest = time.perf_counter() - started
+        print(f"ingestão: {len(events)} eventos em {ingest * 1000:.0f} ms "
+              f"({len(events) / ingest:,.0f} eventos/s, lotes de {args.batch})")
+
+        # Espera o recálculo em background (debounce) e mede até o payload mudar
+        expected_rollup = DailyRollup()
+        expected_rollup.reset(tables['appointments'])
+        expected = analytics.quick_stats_from_rollup(expected_rollup)
+        while True:
+            payload = (await client.get('/api/analytics/quick-stats')).json()
+            if payload == expected or time.perf_counter() - started > 30:
+                break
+            await asyncio.sleep(0.01)
+        print(f"quick-stats atualizado {time.perf_counter() - started:.2f}s depois do primeiro evento; "
+              f"confere com o cálculo do zero: {payload == expected}")
+        print(f"queries ao Supabase durante a ingestão e leituras: {fake.query_count - queries}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=100_000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=50, help='eventos por POST')
+    parser.add_argument('--latency', type=float, default=0.02, help='latência simulada por query (s)')
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main_cli()
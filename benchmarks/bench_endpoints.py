@@ -0,0 +1,272 @@
+# bench_endpoints.py - Latência, vazão, memória e queries por endpoint em escala
+#
+# Uso:
+#   python benchmarks/bench_endpoints.py [--scales 1k,100k,1m] [--latency 0.02]
+#                                        [--concurrency 16] [--requests 200]
+#                                        [--output arquivo.json] [--baseline arquivo.json]
+#
+# Cada escala roda num subprocesso próprio (memória de pico isolada) com o app
+# em processo (ASGI) contra o FakeSupabase semeado com dados sintéticos. Por
+# endpoint mede:
+#
+# - cold: primeira requisição com caches vazios (sincronização + cálculo) e
+#   quantas queries ela mandou ao "Supabase";
+# - compute: mediana do recálculo do payload (scheduler.refresh) com os
+#   snapshots já carregados - é o custo que o pré-cálculo paga a cada ciclo;
+# - p50/p99 e req/s com `--concurrency` clientes em paralelo na mesma URL
+#   (caminho de produção: cache HTTP + payload pré-calculado).
+#
+# O resultado vai para benchmarks/results/<commit>.json; com --baseline as
+# métricas são comparadas com outra execução e variações acima de
+# --threshold são marcadas como regressão (código de saída 1).
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = {
+    'business-stats': '/api/analytics/business-stats',
+    'quick-stats': '/api/analytics/quick-stats',
+    'client-segmentation': '/api/ml/client-segmentation',
+    'demand-prediction': '/api/ml/demand-prediction',
+    'client-demographics': '/api/analytics/client-demographics',
+}
+
+# Métricas comparadas com o baseline e se "maior é pior"
+COMPARED = {
+    'cold_ms': True, 'cold_queries': True, 'compute_ms': True,
+    'p50_ms': True, 'p99_ms': True, 'throughput_rps': False,
+}
+
+
+def parse_scale(text):
+    text = text.strip().lower()
+    for suffix, factor in (('k', 1_000), ('m', 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _rss_mb():
+    # ru_maxrss é em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ---------------------------------------------------------------- subprocesso
+
+def _reset(main):
+    """Esquece snapshots, cópias locais e payloads calculados (volta ao estado frio)"""
+    from cache import SnapshotCache
+    main.snapshots._tenants.clear()
+    main.snapshots.cache = SnapshotCache(ttl=main.snapshots.SNAPSHOT_TTL, max_stale=main.snapshots.SNAPSHOT_MAX_STALE)
+    main.scheduler.results.clear()
+
+
+async def _measure(main, fake, client, name, route, args):
+    _reset(main)
+    queries = fake.query_count
+    started = time.perf_counter()
+    # Query string única: não reaproveita a entrada do cache HTTP
+    (await client.get(route, params={'bench': 'cold'})).raise_for_status()
+    cold = time.perf_counter() - started
+    cold_queries = fake.query_count - queries
+
+    computes = []
+    for _ in range(args.compute_repeat):
+        started = time.perf_counter()
+        await main.scheduler.refresh(name)
+        computes.append(time.perf_counter() - started)
+
+    latencies = []
+
+    async def one():
+        started = time.perf_counter()
+        (await client.get(route)).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    async def worker(count):
+        for _ in range(count):
+            await one()
+
+    per_worker = max(1, args.requests // args.concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'cold_ms': round(cold * 1000, 2),
+        'cold_queries': cold_queries,
+        'compute_ms': round(statistics.median(computes) * 1000, 3),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+    }
+
+
+def run_worker(args):
+    import httpx
+
+    import repository
+    from fake_supabase import FakeSupabase, synthetic_tables
+
+    n = args.worker
+    rss_start = _rss_mb()
+    started = time.perf_counter()
+    tables = synthetic_tables(n, max(200, n // 20), days=args.days)
+    fake = FakeSupabase(tables, latency=args.latency)
+    repository.supabase = fake
+    seed_seconds = time.perf_counter() - started
+    rss_seeded = _rss_mb()
+
+    import log
+    import main
+    log.logger.setLevel('WARNING')
+
+    async def go():
+        results = {}
+        async with httpx.AsyncClient(app=main.app, base_url='http://bench') as client:
+            for name, route in ENDPOINTS.items():
+                results[name] = await _measure(main, fake, client, name, route, args)
+        return results
+
+    endpoints = asyncio.run(go())
+    print(json.dumps({
+        'appointments': n,
+        'users': len(tables['users']),
+        'seed_seconds': round(seed_seconds, 2),
+        'rss_seeded_mb': round(rss_seeded - rss_start, 1),
+        'peak_rss_mb': round(_rss_mb(), 1),
+        'app_peak_mb': round(_rss_mb() - rss_seeded, 1),
+        'total_queries': fake.query_count,
+        'endpoints': endpoints,
+    }))
+
+
+# ---------------------------------------------------------------- processo principal
+
+def run_scale(n, args, state_dir):
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker', str(n),
+        '--latency', str(args.latency), '--concurrency', str(args.concurrency),
+        '--requests', str(args.requests), '--compute-repeat', str(args.compute_repeat),
+        '--days', str(args.days),
+    ]
+    env = dict(os.environ, PRECOMPUTE_ENABLED='0', LOG_LEVEL='WARNING',
+               KMEANS_STATE_PATH=os.path.join(state_dir, f'centroids-{n}.json'))
+    completed = subprocess.run(command, cwd=BENCH_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"escala {n} falhou:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_report(results):
+    header = f"{'escala':>8} {'endpoint':<20} {'cold ms':>9} {'queries':>7} {'compute ms':>10} " \
+             f"{'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}"
+    print(header)
+    print('-' * len(header))
+    for scale, result in results['scales'].items():
+        for name, m in result['endpoints'].items():
+            print(f"{scale:>8} {name:<20} {m['cold_ms']:>9.1f} {m['cold_queries']:>7} {m['compute_ms']:>10.2f} "
+                  f"{m['p50_ms']:>8.2f} {m['p99_ms']:>8.2f} {m['throughput_rps']:>8.0f}")
+        print(f"{scale:>8} memória: dados {result['rss_seeded_mb']:.0f} MiB, app +{result['app_peak_mb']:.0f} MiB, "
+              f"pico {result['peak_rss_mb']:.0f} MiB; {result['total_queries']} queries no total")
+
+
+def compare(results, baseline, threshold):
+    """Imprime as variações contra o baseline; devolve quantas passaram do limite"""
+    regressions = 0
+    print(f"\ncomparação com {baseline.get('commit')} (limite {threshold:.0%}):")
+    for scale, result in results['scales'].items():
+        base_scale = baseline['scales'].get(scale)
+        if base_scale is None:
+            continue
+        for name, metrics in result['endpoints'].items():
+            base = base_scale['endpoints'].get(name, {})
+            for metric, higher_is_worse in COMPARED.items():
+                old, new = base.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                worse = change > threshold if higher_is_worse else change < -threshold
+                if worse:
+                    regressions += 1
+                if worse or abs(change) > threshold:
+                    label = 'REGRESSÃO' if worse else 'melhora'
+                    print(f"  {label:<10} {scale:>6} {name:<20} {metric:<15} {old:>10} -> {new:<10} ({change:+.0%})")
+    if not regressions:
+        print("  nenhuma regressão")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1k,100k,1m', help='tamanhos de `appointments` (ex.: 1k,100k,1m)')
+    parser.add_argument('--latency', type=float, default=0.02, help='latência simulada por query (s)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requisições por endpoint na medida de vazão')
+    parser.add_argument('--compute-repeat', type=int, default=5)
+    parser.add_argument('--days', type=int, default=365, help='histórico sintético em dias')
+    parser.add_argument('--output', help='JSON de saída (padrão: benchmarks/results/<commit>.json)')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='variação considerada regressão (0.2 = 20%%)')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args)
+        return
+
+    results = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': {k: getattr(args, k) for k in ('latency', 'concurrency', 'requests', 'compute_repeat', 'days')},
+        'scales': {},
+    }
+    with tempfile.TemporaryDirectory() as state_dir:
+        for scale in args.scales.split(','):
+            print(f"rodando escala {scale}...", file=sys.stderr)
+            results['scales'][scale.strip()] = run_scale(parse_scale(scale), args, state_dir)
+
+    print_report(results)
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresultado salvo em {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != results['params']:
+            print("⚠️ parâmetros diferentes do baseline; a comparação pode não ser justa")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,104 @@
+# bench_quick_stats.py - quick-stats: lista de dicts vs rollup diário
+#
+# Uso: python benchmarks/bench_quick_stats.py [--appointments 200000] [--repeat 20]
+#
+# Mede o CPU por requisição de quick-stats no cálculo antigo (passadas pela
+# lista de dicts) e no caminho da API (analytics.quick_stats_from_rollup sobre
+# o DailyRollup) e a memória retida (tracemalloc) pelas linhas decodificadas
+# do JSON do PostgREST e pelo rollup montado a partir delas. O rollup é
+# memória a mais: a cópia local (sync.py) continua guardando as linhas.
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from fake_supabase import synthetic_tables  # noqa: E402
+from rollup import DailyRollup  # noqa: E402
+
+
+def legacy_quick_stats(appointments, now=None):
+    """quick-stats como era antes do rollup (quatro passadas + services.count)"""
+    since = analytics._since(30, now)
+    appointments = [a for a in appointments if (a.get('date') or '') >= since]
+
+    total_appointments = len(appointments)
+    canceled = len([a for a in appointments if a.get('status') == 'canceled'])
+    confirmed_count = len([a for a in appointments if a.get('status') == 'confirmed'])
+    customer_emails = list(set([a['customer_email'] for a in appointments if a.get('customer_email')]))
+    revenue = [a.get('total_amount', 0) for a in appointments if a.get('total_amount')]
+    average_ticket = sum(revenue) / len(revenue) if revenue else 0
+
+    time_slots = {}
+    for appointment in appointments:
+        if appointment.get('start_time'):
+            try:
+                hour = int(appointment['start_time'].split(':')[0])
+                time_slots[hour] = time_slots.get(hour, 0) + 1
+            except Exception:
+                continue
+    peak_hour = max(time_slots.items(), key=lambda x: x[1])[0] if time_slots else None
+
+    services = [a.get('service') for a in appointments if a.get('service')]
+    popular_service = max(set(services), key=services.count) if services else None
+
+    return analytics.quick_stats_payload(total_appointments, confirmed_count, canceled, len(customer_emails),
+                                         average_ticket, peak_hour, popular_service)
+
+
+def retained(build):
+    """(objeto, bytes alocados e ainda vivos ao fim de `build()`)"""
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--appointments', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    columns = ['id', 'date', 'start_time', 'status', 'service', 'total_amount', 'customer_email']
+    rows = synthetic_tables(args.appointments, args.users, days=args.days)['appointments']
+    payload = json.dumps([{c: r[c] for c in columns} for r in rows])
+    del rows
+    print(f"{args.appointments} agendamentos em {args.days} dias")
+
+    rows, rows_bytes = retained(lambda: json.loads(payload))
+
+    def build_rollup():
+        rollup = DailyRollup()
+        rollup.reset(rows)
+        return rollup
+
+    rollup, rollup_bytes = retained(build_rollup)
+    rollup_build = timed(build_rollup, 3)
+
+    legacy = timed(lambda: legacy_quick_stats(rows), args.repeat)
+    from_rollup = timed(lambda: analytics.quick_stats_from_rollup(rollup), args.repeat)
+
+    print(f"memória   linhas (cópia local): {rows_bytes / 2**20:8.1f} MiB   "
+          f"rollup (além delas): {rollup_bytes / 2**20:6.1f} MiB")
+    print(f"montagem do rollup (uma vez por ressincronização completa): {rollup_build * 1000:.0f} ms")
+    print(f"quick-stats   dicts: {legacy * 1000:8.1f} ms   rollup: {from_rollup * 1000:6.2f} ms "
+          f"({legacy / from_rollup:.0f}x mais rápido)")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,78 @@
+# bench_scoring.py - Scoring de churn/CLV: cálculo completo, incremental e paginação
+#
+# Uso:
+#   python benchmarks/bench_scoring.py [--appointments 300000] [--customers 60000]
+#                                      [--days 730] [--updates 1,100,2000] [--limit 5000]
+#
+# Monta um AppointmentStore com dados sintéticos e o CustomerScores (scoring.py)
+# como listener e mede:
+#
+# - o cálculo completo (passada vetorizada por todos os agendamentos);
+# - o recálculo depois de `--updates` mudanças de status, que só toca os
+#   clientes dessas linhas, comparado com refazer tudo;
+# - o tempo de servir todas as páginas de `--limit` clientes.
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_supabase import synthetic_tables
+from scoring import CustomerScores
+from sync import AppointmentStore
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=300_000)
+    parser.add_argument('--customers', type=int, default=60_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--updates', default='1,100,2000')
+    parser.add_argument('--limit', type=int, default=5000, help='clientes por página')
+    args = parser.parse_args()
+
+    rows = synthetic_tables(args.appointments, args.customers, days=args.days)['appointments']
+    store = AppointmentStore()
+    store.merge(rows)
+    scores = CustomerScores()
+    _, attach_ms = timed(lambda: store.add_listener(scores))
+    rescored, full_ms = timed(scores.refresh)
+    print(f"{len(rows)} agendamentos, {rescored} clientes: índice {attach_ms:.0f} ms, "
+          f"cálculo completo {full_ms:.0f} ms")
+
+    print(f"{'mudanças':>9} {'clientes':>9} {'incremental ms':>15} {'completo ms':>12}")
+    for updates in [int(n) for n in args.updates.split(',')]:
+        changed = []
+        for row in random.sample(rows, min(updates, len(rows))):
+            row = dict(row, status='canceled' if row['status'] == 'confirmed' else 'confirmed')
+            changed.append(row)
+        store.merge(changed, advance=False)
+        rescored, incremental_ms = timed(scores.refresh)
+        scores.reset(store.rows())
+        _, full_ms = timed(scores.refresh)
+        print(f"{updates:>9} {rescored:>9} {incremental_ms:>15.2f} {full_ms:>12.1f}")
+
+    def all_pages():
+        pages, cursor = 0, None
+        while True:
+            page = scores.page(cursor, args.limit)
+            pages += 1
+            cursor = page['nextCursor']
+            if cursor is None:
+                return pages
+
+    pages, pages_ms = timed(all_pages)
+    print(f"\n{pages} páginas de até {args.limit} clientes em {pages_ms:.0f} ms "
+          f"({pages_ms / pages:.1f} ms por página)")
+
+
+if __name__ == '__main__':
+    main()
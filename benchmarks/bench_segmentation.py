@@ -0,0 +1,78 @@
+# bench_segmentation.py - Segmentação: varredura por usuário vs índice por cliente
+#
+# Uso: python benchmarks/bench_segmentation.py [--users 10000] [--appointments 500000]
+#
+# A versão antiga filtra todos os agendamentos para cada usuário
+# (O(usuários × agendamentos)); rodá-la inteira em 10k × 500k levaria horas,
+# então ela é medida numa amostra de usuários e extrapolada linearmente.
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from customers import CustomerIndex  # noqa: E402
+from fake_supabase import synthetic_tables  # noqa: E402
+
+
+def legacy_client_data(confirmed_appointments, users):
+    client_data = []
+    for user in users:
+        user_appointments = [a for a in confirmed_appointments if a.get('customer_email') == user.get('email')]
+        total_spent = sum([a.get('total_amount', 0) for a in user_appointments])
+        if user_appointments:
+            last_date = max([datetime.strptime(a['date'], '%Y-%m-%d') for a in user_appointments if a.get('date')])
+            last_visit_days = (datetime.now() - last_date).days
+        else:
+            last_visit_days = 365
+        client_data.append({
+            'user_id': user['id'],
+            'total_spent': total_spent,
+            'visit_count': len(user_appointments),
+            'last_visit_days': last_visit_days,
+        })
+    return client_data
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--appointments', type=int, default=500_000)
+    parser.add_argument('--legacy-sample', type=int, default=20, help='usuários medidos na versão antiga')
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.appointments, args.users, days=720)
+    confirmed = [a for a in tables['appointments'] if a['status'] == 'confirmed']
+    users = tables['users']
+    print(f"{len(users)} usuários, {len(confirmed)} agendamentos confirmados")
+
+    sample = users[:args.legacy_sample]
+    started = time.perf_counter()
+    legacy_client_data(confirmed, sample)
+    legacy = (time.perf_counter() - started) / len(sample) * len(users)
+    print(f"varredura por usuário: ~{legacy:.1f} s (extrapolado de {len(sample)} usuários)")
+
+    index = CustomerIndex()
+    started = time.perf_counter()
+    index.reset(confirmed)
+    index.refresh()
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    analytics.client_segmentation(index, users)
+    indexed = time.perf_counter() - started
+    print(f"índice por cliente:    {indexed * 1000:.0f} ms ({legacy / indexed:.0f}x mais rápido), "
+          f"fora a carga inicial do índice ({build * 1000:.0f} ms)")
+
+    # Uma mudança depois da carga: só o cliente afetado é recalculado
+    row = confirmed[0]
+    index.apply(row, {**row, 'total_amount': (row.get('total_amount') or 0) + 10})
+    started = time.perf_counter()
+    index.refresh()
+    print(f"atualização incremental (1 linha): {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main_cli()
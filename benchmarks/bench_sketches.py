@@ -0,0 +1,81 @@
+# bench_sketches.py - Clientes distintos no rollup: exato vs HyperLogLog
+#
+# Uso:
+#   python benchmarks/bench_sketches.py [--appointments 300000] [--customers 60000]
+#                                       [--days 730] [--updates 2000]
+#
+# Monta o rollup diário nos dois modos (ROLLUP_DISTINCT=exact / hll) sobre os
+# mesmos dados sintéticos e compara, para janelas de 30 dias, 1 ano e todo o
+# histórico: tempo da contagem, erro relativo do HyperLogLog e o custo de
+# refazer os sketches depois de `--updates` mudanças de status.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_supabase import synthetic_tables
+from rollup import DailyRollup
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def report(exact, approximate, windows):
+    for label, since in windows:
+        for status in ('confirmed', None):
+            expected, exact_ms = timed(lambda: exact.distinct_customers(since, status))
+            estimate, hll_ms = timed(lambda: approximate.distinct_customers(since, status))
+            error = (estimate - expected) / expected if expected else 0.0
+            print(f"{label:>10} {str(status):>10} {expected:>9} {estimate:>9} {error:>+7.2%} "
+                  f"{exact_ms:>9.1f} {hll_ms:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=300_000)
+    parser.add_argument('--customers', type=int, default=60_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--updates', type=int, default=2000, help='mudanças de status antes da segunda medida')
+    args = parser.parse_args()
+
+    rows = synthetic_tables(args.appointments, args.customers, days=args.days)['appointments']
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(row['date'], {})[row['id']] = row
+
+    def rows_on(day):
+        return list(partitions.get(day, {}).values())
+
+    exact = DailyRollup('exact', rows_on)
+    approximate = DailyRollup('hll', rows_on)
+    _, exact_ms = timed(lambda: exact.reset(rows))
+    _, hll_ms = timed(lambda: approximate.reset(rows))
+    print(f"{len(rows)} agendamentos: rollup exato {exact_ms:.0f} ms, com sketches {hll_ms:.0f} ms "
+          f"({approximate.info()['sketches']} sketches)")
+
+    today = date.today()
+    windows = [('30 dias', (today - timedelta(days=30)).isoformat()),
+               ('1 ano', (today - timedelta(days=365)).isoformat()),
+               ('tudo', None)]
+    print(f"{'janela':>10} {'status':>10} {'exato':>9} {'hll':>9} {'erro':>7} {'exato ms':>9} {'hll ms':>9}")
+    report(exact, approximate, windows)
+
+    for row in random.sample(rows, min(args.updates, len(rows))):
+        old = dict(row)
+        row['status'] = 'canceled' if row['status'] == 'confirmed' else 'confirmed'
+        exact.apply(old, row)
+        approximate.apply(old, row)
+    print(f"\ndepois de {args.updates} mudanças de status "
+          f"({approximate.info()['stale_sketches']} sketches a refazer na primeira leitura):")
+    report(exact, approximate, windows)
+
+
+if __name__ == '__main__':
+    main()
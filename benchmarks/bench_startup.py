@@ -0,0 +1,119 @@
+# bench_startup.py - Tempo de cold start: importação do main e primeiro /health
+#
+# Uso:
+#   python benchmarks/bench_startup.py [--runs 5]
+#
+# Cada medida roda num processo novo (sem módulos já importados), com a app de
+# verdade (main.py, cliente real do supabase-py; o /health não faz query):
+#
+# - import: `import main`, e quais módulos pesados (supabase-py, httpx, NumPy,
+#   ML) já estão carregados nesse momento;
+# - import eager: `import main` mais o que antes acontecia na importação
+#   (criar o cliente do Supabase e importar NumPy/ML), como referência;
+# - /health: do spawn do uvicorn até o primeiro 200 em /health;
+# - aquecido: do spawn até o log "aquecimento concluído" (cliente criado e
+#   módulos pesados importados em background pelo lifespan).
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+HEAVY = ('supabase', 'httpx', 'numpy', 'customers', 'forecasting', 'segmentation')
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+if {eager}:
+    import importlib, repository
+    repository.client()
+    for name in main.WARM_MODULES:
+        importlib.import_module(name)
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(eager):
+    script = IMPORT_SCRIPT.format(eager=eager, heavy=HEAVY)
+    env = dict(os.environ, PRECOMPUTE_ENABLED='0', LOG_LEVEL='WARNING')
+    out = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_server():
+    """Segundos até o primeiro /health e até o fim do aquecimento"""
+    import httpx
+    port = _free_port()
+    # Sem pré-cálculo: a medida não depende do Supabase estar acessível
+    env = dict(os.environ, PRECOMPUTE_ENABLED='0', LOG_LEVEL='INFO')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+                               '--port', str(port), '--log-level', 'warning'],
+                              cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        health = None
+        while health is None:
+            if server.poll() is not None:
+                raise RuntimeError('servidor saiu antes de responder')
+            try:
+                if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                    health = time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.005)
+        # Lê o log numa thread: sem a linha do aquecimento, desiste em 30 s
+        warmed = threading.Event()
+        reached = []
+
+        def read_log():
+            for line in server.stdout:
+                if 'aquecimento' in line:
+                    reached.append(time.perf_counter() - started)
+                    warmed.set()
+                    return
+
+        threading.Thread(target=read_log, daemon=True).start()
+        warmed.wait(timeout=30)
+        return health, reached[0] if reached else None
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    lazy = [measure_import(False) for _ in range(args.runs)]
+    eager = [measure_import(True) for _ in range(args.runs)]
+    servers = [measure_server() for _ in range(args.runs)]
+
+    print(f"mediana de {args.runs} processos novos")
+    print(f"{'import main':>22} {statistics.median(r['seconds'] for r in lazy) * 1000:>8.0f} ms  "
+          f"pesados carregados: {', '.join(lazy[0]['loaded']) or 'nenhum'}")
+    print(f"{'import eager':>22} {statistics.median(r['seconds'] for r in eager) * 1000:>8.0f} ms  "
+          f"pesados carregados: {', '.join(eager[0]['loaded'])}")
+    print(f"{'spawn -> /health 200':>22} {statistics.median(h for h, _ in servers) * 1000:>8.0f} ms")
+    warm = [w for _, w in servers if w is not None]
+    if warm:
+        print(f"{'spawn -> aquecido':>22} {statistics.median(warm) * 1000:>8.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# bench_workers.py - Vazão com 1..N workers e cache compartilhado
+#
+# Uso:
+#   python benchmarks/bench_workers.py [--workers 1,2,4] [--backend sqlite|redis|memory]
+#                                      [--duration 10] [--concurrency 16] [--clients N]
+#                                      [--bypass-http-cache]
+#
+# Para cada quantidade de workers sobe a app de verdade (gunicorn com
+# gunicorn.conf.py; sem gunicorn, `uvicorn --workers`) com benchmarks/fake_app.py
+# e dispara carga de `--clients` processos (padrão: um por worker), cada um com
+# `--concurrency` conexões, nas rotas do dashboard. Com --backend redis e sem
+# CACHE_REDIS_URL, sobe o substituto benchmarks/fake_redis.py.
+#
+# Mede req/s, p50/p99 e quantos cálculos de payload rodaram por rota no total
+# (somando os workers): com o cache compartilhado o pré-cálculo roda uma vez e
+# não uma vez por worker. Com --bypass-http-cache cada requisição tem query
+# string única e vai até o payload pré-calculado (cache compartilhado).
+#
+# A vazão só escala até o número de núcleos da máquina (os clientes de carga
+# também disputam CPU).
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+ROUTES = [
+    '/api/analytics/business-stats',
+    '/api/analytics/quick-stats',
+    '/api/analytics/revenue-data',
+    '/api/analytics/service-performance',
+    '/api/ml/insights',
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _server_command(workers, port):
+    if shutil.which('gunicorn'):
+        return ['gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'fake_app:app']
+    return [sys.executable, '-m', 'uvicorn', 'fake_app:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning']
+
+
+def _wait_ready(port, timeout=120):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('servidor não respondeu')
+
+
+def _client(port, duration, concurrency, bypass, results):
+    """Processo de carga: `concurrency` conexões em paralelo por `duration` segundos"""
+    import httpx
+
+    async def go():
+        latencies = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=30) as client:
+            async def worker(offset):
+                nonlocal errors
+                i = offset
+                while time.perf_counter() < deadline:
+                    route = ROUTES[i % len(ROUTES)]
+                    params = {'bench': f'{os.getpid()}-{i}'} if bypass else None
+                    started = time.perf_counter()
+                    try:
+                        (await client.get(route, params=params)).raise_for_status()
+                        latencies.append(time.perf_counter() - started)
+                    except httpx.HTTPError:
+                        errors += 1
+                    i += concurrency
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return latencies, errors
+
+    results.put(asyncio.run(go()))
+
+
+def _job_counts(port, samples=20):
+    """Cálculos de payload por job, somando os workers (cada /metrics cai num worker)"""
+    import httpx
+    counts = {}
+    for _ in range(samples):
+        # Mesma conexão (keep-alive) para as duas requisições: mesmo worker
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=5) as client:
+            text = client.get('/metrics').text
+            worker = client.get('/api/debug/precompute').json()['owner']
+        pid_counts = {}
+        for line in text.splitlines():
+            if line.startswith('precompute_job_duration_seconds_count'):
+                job = line.split('job="')[1].split('"')[0]
+                pid_counts[job] = pid_counts.get(job, 0) + float(line.rsplit(' ', 1)[1])
+        counts[worker] = pid_counts
+    total = {}
+    for pid_counts in counts.values():
+        for job, n in pid_counts.items():
+            total[job] = total.get(job, 0) + int(n)
+    return total, len(counts)
+
+
+def run(workers, args, state_dir, redis_url):
+    port = _free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), HOST='127.0.0.1',
+               LOG_LEVEL='WARNING', CACHE_BACKEND=args.backend,
+               CACHE_SQLITE_PATH=os.path.join(state_dir, f'cache-{workers}.sqlite3'),
+               CACHE_KEY_PREFIX=f'bench{workers}:', PRECOMPUTE_INTERVAL=str(args.interval),
+               FAKE_APPOINTMENTS=str(args.appointments), FAKE_LATENCY=str(args.latency),
+               KMEANS_STATE_PATH=os.path.join(state_dir, f'centroids-{workers}.json'))
+    if redis_url:
+        env['CACHE_REDIS_URL'] = redis_url
+    server = subprocess.Popen(_server_command(workers, port), cwd=BENCH_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+        import httpx
+        for route in ROUTES:
+            httpx.get(f'http://127.0.0.1:{port}{route}', timeout=120).raise_for_status()
+
+        clients = args.clients or workers
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_client, args=(port, args.duration, args.concurrency,
+                                                                   args.bypass_http_cache, queue))
+                     for _ in range(clients)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [queue.get() for _ in processes]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+
+        latencies = [latency for outcome, _ in outcomes for latency in outcome]
+        computes, seen = _job_counts(port)
+        return {
+            'workers': workers,
+            'rps': len(latencies) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+            'p99_ms': _percentile(latencies, 99) * 1000 if latencies else None,
+            'errors': sum(errors for _, errors in outcomes),
+            'computes': computes,
+            'workers_seen': seen,
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--backend', default='sqlite', choices=('sqlite', 'redis', 'memory'))
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16, help='conexões por processo de carga')
+    parser.add_argument('--clients', type=int, help='processos de carga (padrão: um por worker)')
+    parser.add_argument('--appointments', type=int, default=20000)
+    parser.add_argument('--latency', type=float, default=0.02, help='latência simulada por query (s)')
+    parser.add_argument('--interval', type=float, default=5, help='PRECOMPUTE_INTERVAL dos workers')
+    parser.add_argument('--bypass-http-cache', action='store_true')
+    args = parser.parse_args()
+
+    redis = None
+    redis_url = os.getenv('CACHE_REDIS_URL')
+    if args.backend == 'redis' and not redis_url:
+        redis_port = _free_port()
+        redis = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'fake_redis.py'), '--port', str(redis_port)])
+        redis_url = f'redis://127.0.0.1:{redis_port}/0'
+        time.sleep(0.5)
+
+    print(f"{os.cpu_count()} núcleos, backend {args.backend}, "
+          f"servidor {'gunicorn' if shutil.which('gunicorn') else 'uvicorn --workers'}")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}  cálculos por job (todos os workers)")
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            for workers in [int(w) for w in args.workers.split(',')]:
+                result = run(workers, args, state_dir, redis_url)
+                computes = ', '.join(f"{job}={n}" for job, n in sorted(result['computes'].items()))
+                print(f"{result['workers']:>7} {result['rps']:>9.0f} {result['p50_ms']:>8.2f} "
+                      f"{result['p99_ms']:>8.2f} {result['errors']:>6}  {computes} "
+                      f"({result['workers_seen']} workers amostrados)")
+    finally:
+        if redis is not None:
+            redis.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+# fake_app.py - A app contra o FakeSupabase, para rodar num servidor de verdade
+#
+#   cd benchmarks && gunicorn -c ../gunicorn.conf.py fake_app:app
+#
+# Cada worker gera os mesmos dados sintéticos (semente fixa) ao importar.
+# FAKE_APPOINTMENTS e FAKE_LATENCY controlam o tamanho e a latência simulada.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import repository  # noqa: E402
+from fake_supabase import FakeSupabase, synthetic_tables  # noqa: E402
+
+_n = int(os.getenv("FAKE_APPOINTMENTS", "20000"))
+repository.supabase = FakeSupabase(synthetic_tables(_n, max(200, _n // 20)),
+                                   latency=float(os.getenv("FAKE_LATENCY", "0.02")))
+
+from main import app  # noqa: E402,F401
@@ -0,0 +1,119 @@
+# fake_redis.py - Servidor mínimo compatível com o protocolo do Redis
+#
+# Uso:
+#   python benchmarks/fake_redis.py [--port 6399]
+#
+# Substituto local para testar CACHE_BACKEND=redis sem um Redis de verdade:
+# atende os comandos que shared_cache.RedisBackend usa (GET, SET com NX/EX/PX,
+# INCR, PEXPIRE, DEL, PING, SELECT, AUTH) sobre um dict em memória, num único
+# event loop (as operações são atômicas como no Redis).
+import argparse
+import asyncio
+import time
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command, args):
+        command = command.upper()
+        if command == b'PING':
+            return 'PONG'
+        if command in (b'SELECT', b'AUTH'):
+            return 'OK'
+        if command == b'GET':
+            return self.get(args[0])
+        if command == b'SET':
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            expires = None
+            for option, multiplier in ((b'EX', 1.0), (b'PX', 0.001)):
+                if option in options:
+                    expires = time.monotonic() + float(args[2 + options.index(option) + 1]) * multiplier
+            if b'NX' in options and self.get(key) is not None:
+                return None
+            self.data[key] = (value, expires)
+            return 'OK'
+        if command == b'INCR':
+            value = int(self.get(args[0]) or 0) + 1
+            _, expires = self.data.get(args[0], (None, None))
+            self.data[args[0]] = (str(value).encode(), expires)
+            return value
+        if command == b'PEXPIRE':
+            value = self.get(args[0])
+            if value is None:
+                return 0
+            self.data[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return 1
+        if command == b'DEL':
+            return sum(self.data.pop(key, None) is not None for key in args)
+        return Exception(f"ERR unknown command '{command.decode()}'")
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, Exception):
+        return b'-' + str(value).encode() + b'\r\n'
+    if isinstance(value, str):
+        return b'+' + value.encode() + b'\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        # Comando inline ("PING\r\n")
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+async def serve(port, host='127.0.0.1'):
+    store = Store()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                args = await read_command(reader)
+                if not args:
+                    break
+                writer.write(encode(store.execute(args[0], args[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6399)
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.host))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# fake_supabase.py - Stand-in em memória do cliente Supabase para benchmarks
+#
+# Imita a cadeia de métodos do postgrest (select/eq/gte/lte/gt/order/limit/execute)
+# sobre listas de dicts. `latency` simula o round-trip bloqueante do PostgREST
+# com time.sleep, exatamente como o cliente síncrono real se comporta.
+#
+# Páginas por keyset (`order(col).gt(col, último).limit(n)`) usam um índice
+# ordenado por coluna, então paginar 1M de linhas não varre a tabela a cada página.
+import time
+from bisect import bisect_right
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.path = f'/{table}'
+        self.columns = None
+        self.filters = []
+        self.order_by = None
+        self.max_rows = None
+
+    def select(self, columns='*'):
+        if columns and columns != '*':
+            self.columns = [c.strip() for c in columns.split(',')]
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(('eq', column, value, lambda row: row.get(column) == value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(('gte', column, value,
+                             lambda row: row.get(column) is not None and row.get(column) >= value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(('lte', column, value,
+                             lambda row: row.get(column) is not None and row.get(column) <= value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(('gt', column, value,
+                             lambda row: row.get(column) is not None and row.get(column) > value))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def execute(self):
+        self.client.query_count += 1
+        if self.client.latency:
+            time.sleep(self.client.latency)
+
+        # Como o PostgREST: filtro numa coluna que a tabela não tem é erro
+        table = self.client.tables.get(self.table)
+        for _, column, *_ in self.filters:
+            if table and column not in table[0]:
+                raise FakeAPIError('42703', f'column {self.table}.{column} does not exist')
+
+        rows = self._keyset_page()
+        if rows is None:
+            rows = [row for row in self.client.tables.get(self.table, []) if all(f(row) for *_, f in self.filters)]
+            if self.order_by:
+                column, desc = self.order_by
+                rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            if self.max_rows is not None:
+                rows = rows[:self.max_rows]
+        if self.columns:
+            rows = [{c: row.get(c) for c in self.columns} for row in rows]
+        else:
+            rows = [dict(row) for row in rows]
+        return FakeResponse(rows)
+
+
+    def _keyset_page(self):
+        """Página `order(col).gt(col, x).limit(n)` via índice ordenado (None se não se aplica)"""
+        if not self.order_by or self.order_by[1] or self.max_rows is None:
+            return None
+        column = self.order_by[0]
+        keys, ordered = self.client.sorted_index(self.table, column)
+        start = 0
+        filters = []
+        for op, filter_column, value, check in self.filters:
+            if op == 'gt' and filter_column == column:
+                start = max(start, bisect_right(keys, value))
+            else:
+                filters.append(check)
+        rows = []
+        for row in ordered[start:] if start else ordered:
+            if all(f(row) for f in filters):
+                rows.append(row)
+                if len(rows) == self.max_rows:
+                    break
+        return rows
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeRPC:
+    def __init__(self, client, fn, params):
+        self.client = client
+        self.fn = fn
+        self.params = params
+        self.path = f'/rpc/{fn}'
+
+    def execute(self):
+        self.client.query_count += 1
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        function = self.client.functions.get(self.fn)
+        if function is None:
+            raise FakeAPIError('PGRST202', f'Could not find the function public.{self.fn}')
+        return FakeResponse(function(self.client.tables, **self.params))
+
+
+class FakeSupabase:
+    """Substituto de `supabase.Client` para uso nos benchmarks
+
+    `functions` mapeia nome -> callable(tables, **params) para simular RPCs.
+    """
+
+    def __init__(self, tables=None, latency=0.0, functions=None):
+        self.tables = tables or {}
+        self.latency = latency
+        self.functions = functions or {}
+        self.query_count = 0
+        self._indexes = {}
+
+    def sorted_index(self, table, column):
+        """(chaves, linhas) da tabela ordenadas por `column`; refeito se a tabela mudou de tamanho"""
+        rows = self.tables.get(table, [])
+        cached = self._indexes.get((table, column))
+        if cached is None or cached[0] is not rows or cached[1] != len(rows):
+            ordered = sorted((row for row in rows if row.get(column) is not None), key=lambda row: row[column])
+            cached = self._indexes[(table, column)] = (rows, len(rows), [row[column] for row in ordered], ordered)
+        return cached[2], cached[3]
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params):
+        return FakeRPC(self, fn, params)
+
+
+SERVICES = ['Corte de Cabelo', 'Coloração', 'Manicure', 'Maquiagem', 'Design de Sobrancelhas', 'Escova']
+STATUSES = ['confirmed'] * 7 + ['canceled'] * 2 + ['pending']
+
+
+def synthetic_tables(n_appointments=1000, n_users=200, days=180, seed=42, n_tenants=1):
+    """Gera tabelas `appointments` e `users` sintéticas e determinísticas
+
+    Cada cliente pertence a um salão (`salon_id`) e seus agendamentos também.
+    """
+    import random
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    today = datetime.now()
+    users = [
+        {
+            'id': i,
+            'email': f'cliente{i}@example.com',
+            'salon_id': f'salao-{i % n_tenants}',
+            'profile_completed': rng.random() < 0.8,
+            'age_group': rng.choice(['18-25 anos', '26-35 anos', '36-45 anos', '46-55 anos']),
+            'hair_type': rng.choice(['Liso', 'Ondulado', 'Cacheado', 'Crespo']),
+            'visit_frequency': rng.choice(['1x por semana', '2x por mês', '1x por mês']),
+            'spending_range': rng.choice(['Até R$ 100', 'R$ 100-300', 'Acima de R$ 300']),
+        }
+        for i in range(n_users)
+    ]
+    appointments = [
+        {
+            'id': i,
+            'updated_at': f'{today - timedelta(days=days):%Y-%m-%d}T00:00:00+00:00',
+            'customer_email': f'cliente{rng.randrange(n_users)}@example.com',
+            'service': rng.choice(SERVICES),
+            'status': rng.choice(STATUSES),
+            'date': (today - timedelta(days=rng.randrange(days))).strftime('%Y-%m-%d'),
+            'start_time': f'{rng.randrange(8, 20):02d}:{rng.choice(["00", "30"])}:00',
+            'total_amount': float(rng.randrange(30, 400)),
+        }
+        for i in range(n_appointments)
+    ]
+    for row in appointments:
+        customer = int(row['customer_email'][len('cliente'):].split('@')[0])
+        row['salon_id'] = f'salao-{customer % n_tenants}'
+    return {'appointments': appointments, 'users': users}
@@ -0,0 +1,147 @@
+# load_test.py - Latência sob concorrência com e sem offload das queries
+#
+# Uso: python benchmarks/load_test.py [--latency 0.05] [--levels 1,2,4,8,16]
+#                                     [--caches warm,cold]
+#
+# Roda o app em processo (ASGI) contra o FakeSupabase com latência bloqueante.
+# No modo "inline" as queries executam direto no event loop (comportamento
+# antigo); no modo "executor" (repository.execute) rodam nas threads do
+# executor. Para cada nível de concorrência mede:
+#
+# - a latência das rotas de analytics. Cada requisição em voo é de um salão
+#   diferente (?tenant=salao-N), então nenhuma carga é compartilhada
+#   (single-flight): numa rodada fria (snapshots, cópias locais e payloads
+#   descartados antes de cada rodada, query string única para não acertar o
+#   cache HTTP) cada uma faz as próprias queries. Inline elas entram em fila
+#   no loop e o p99 cresce com a concorrência; com o executor fica estável até
+#   DB_MAX_WORKERS;
+# - a latência de /health, sondado durante a rodada: ele não faz query, então
+#   só espera quando o event loop está travado por uma query inline.
+#
+# Com caches quentes (depois de uma rodada de aquecimento) as respostas saem
+# do cache HTTP sem query e os dois modos ficam iguais (referência). Todo o estado é descartado entre um modo e outro.
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+import repository  # noqa: E402
+from fake_supabase import FakeSupabase, synthetic_tables  # noqa: E402
+
+ROUTES = [
+    '/api/analytics/business-stats',
+    '/api/analytics/quick-stats',
+    '/api/analytics/service-performance',
+]
+
+
+async def _inline_execute(query):
+    return query.execute().data
+
+
+def _reset():
+    """Esquece snapshots, cópias locais e payloads calculados (volta ao estado frio)"""
+    main.snapshots._tenants.clear()
+    main.snapshots.cache.invalidate()
+    main.scheduler.results.clear()
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def _probe(client, done, latencies, interval=0.002):
+    """Sonda /health a cada `interval` até `done`
+
+    O relógio começa quando a sonda pede para acordar: o tempo que o event
+    loop leva para voltar a ela (travado por uma query inline) entra na
+    latência, como para uma requisição que chegasse naquele instante.
+    """
+    while not done.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        (await client.get('/health')).raise_for_status()
+        latencies.append(time.perf_counter() - started - interval)
+
+
+async def run_level(client, concurrency, rounds, cold):
+    latencies = []
+    health = []
+    requests = 0
+
+    async def one(i):
+        nonlocal requests
+        requests += 1
+        params = {'tenant': f'salao-{i}'}
+        if cold:
+            # Query string única: não reaproveita a entrada do cache HTTP
+            params['bench'] = requests
+        started = time.perf_counter()
+        response = await client.get(ROUTES[i % len(ROUTES)], params=params)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    if not cold:
+        # Rodada de aquecimento, fora da medida
+        await asyncio.gather(*(one(i) for i in range(concurrency)))
+        latencies.clear()
+
+    for _ in range(rounds):
+        if cold:
+            _reset()
+        done = asyncio.Event()
+        probe = asyncio.ensure_future(_probe(client, done, health))
+        await asyncio.gather(*(one(i) for i in range(concurrency)))
+        done.set()
+        await probe
+    return latencies, health
+
+
+async def run(mode, caches, levels, rounds):
+    original = repository.execute
+    if mode == 'inline':
+        repository.execute = _inline_execute
+    _reset()
+    try:
+        async with httpx.AsyncClient(app=main.app, base_url='http://bench') as client:
+            print(f"\n== modo {mode}, caches {caches} ==")
+            print(f"{'concorrência':>12} {'p50 (ms)':>10} {'p99 (ms)':>10} {'/health p99':>12} {'/health máx':>12}")
+            for level in levels:
+                latencies, health = await run_level(client, level, rounds, caches == 'cold')
+                p50 = statistics.median(latencies) * 1000
+                p99 = _percentile(latencies, 99) * 1000
+                print(f"{level:>12} {p50:>10.1f} {p99:>10.1f} {_percentile(health, 99) * 1000:>12.1f} "
+                      f"{max(health) * 1000:>12.1f}")
+    finally:
+        repository.execute = original
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.05, help='latência simulada por query (s)')
+    parser.add_argument('--levels', default='1,2,4,8,16', help='níveis de concorrência')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--appointments', type=int, default=2000)
+    parser.add_argument('--caches', default='warm,cold', help='warm, cold ou os dois')
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(',')]
+    # Um salão por requisição em voo no maior nível
+    tables = synthetic_tables(args.appointments, max(200, max(levels) * 10), n_tenants=max(levels))
+    repository.supabase = FakeSupabase(tables, latency=args.latency)
+    for mode in ('inline', 'executor'):
+        for caches in args.caches.split(','):
+            asyncio.run(run(mode, caches, levels, args.rounds))
+
+
+if __name__ == '__main__':
+    main_cli()
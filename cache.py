@@ -0,0 +1,105 @@
+# cache.py - Cache em memória com TTL, single-flight e stale-while-revalidate
+import asyncio
+import time
+
+
+class SnapshotCache:
+    """Cache assíncrono de snapshots por chave
+
+    - Dentro do `ttl` o valor é servido direto (hit).
+    - Entre `ttl` e `ttl + max_stale` o valor antigo é servido na hora e um
+      refresh roda em background (stale-while-revalidate).
+    - Sem valor (ou velho demais) a requisição espera o carregamento. Se ele
+      falhar e existir um valor antigo, o antigo é devolvido (último bom).
+
+    Em todos os casos só existe um carregamento em voo por chave: misses
+    concorrentes aguardam a mesma task (single-flight).
+    """
+
+    def __init__(self, ttl=60.0, max_stale=300.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._clock = clock
+        self._entries = {}
+        self._inflight = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "errors": 0, "last_good": 0}
+
+    async def get(self, key, loader):
+        """Devolve o snapshot de `key`, usando `loader()` para (re)carregar"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            age = self._clock() - loaded_at
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return value
+            if age < self.ttl + self.max_stale:
+                self.stats["stale_hits"] += 1
+                self._start_load(key, loader)
+                return value
+
+        self.stats["misses"] += 1
+        try:
+            return await asyncio.shield(self._start_load(key, loader))
+        except Exception:
+            if entry is None:
+                raise
+            self.stats["last_good"] += 1
+            return entry[0]
+
+    def peek(self, key):
+        """Valor atual de `key` sem disparar carregamento (ou None)"""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def put(self, key, value):
+        self._entries[key] = (value, self._clock())
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def drop(self, predicate):
+        """Remove as entradas cujas chaves satisfazem `predicate(key)`"""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def info(self):
+        """Contadores e idade de cada entrada, para o endpoint de debug"""
+        served = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        now = self._clock()
+        return {
+            **self.stats,
+            "hit_ratio": (self.stats["hits"] + self.stats["stale_hits"]) / served if served else 0.0,
+            "entries": {str(key): round(now - loaded_at, 1) for key, (_, loaded_at) in self._entries.items()},
+            "inflight": [str(key) for key in self._inflight],
+        }
+
+    def _start_load(self, key, loader):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return task
+
+    async def _load(self, key, loader):
+        try:
+            value = await loader()
+            self._entries[key] = (value, self._clock())
+            self.stats["loads"] += 1
+            return value
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+def _consume_exception(task):
+    # Refresh em background que falhou não tem quem aguarde; evita o warning
+    # "Task exception was never retrieved" (o erro já foi contado em stats)
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,234 @@
+# changefeed.py - Ingestão das mudanças de `appointments` por webhook
+#
+# Em vez de cada recarga consultar o Supabase, um trigger no banco (Database
+# Webhook, ver sql/changefeed.sql) faz POST em /api/ingest/appointments a cada
+# INSERT/UPDATE/DELETE com o payload
+#
+#   {"type": "UPDATE", "table": "appointments", "record": {...}, "old_record": {...}}
+#
+# (ou uma lista deles - um processo local pode reproduzir eventos assim). Cada
+# evento é aplicado na cópia local do tenant e na visão global (sync.py), o que
+# atualiza o rollup diário na hora (o índice por cliente e os scores recebem a
+# mudança na fila deles) e os payloads pré-calculados são refeitos em
+# background depois de CHANGEFEED_DEBOUNCE_SECONDS (eventos em rajada viram um recálculo só).
+#
+# Com CHANGEFEED_ENABLED=1 as leituras não consultam mais o Supabase a cada
+# recarga: o delta só roda a cada SYNC_RECONCILE_SECONDS para recuperar
+# eventos perdidos. Com vários workers o webhook cai em um só deles: os eventos
+# passam pelo cache compartilhado (shared_cache.py) e todos os aplicam.
+import asyncio
+import hmac
+import json
+import os
+import time
+
+import log
+import repository
+import shared_cache
+import snapshots
+from metrics import changefeed_events
+from precompute import scheduler
+from shared_cache import SharedCacheError
+from sync import CHANGEFEED_ENABLED
+
+# Segredo esperado no header X-Webhook-Secret. Obrigatório: sem ele o
+# webhook recusa tudo (qualquer um poderia escrever agendamentos falsos)
+CHANGEFEED_SECRET = os.getenv("CHANGEFEED_SECRET", "")
+CHANGEFEED_DEBOUNCE_SECONDS = float(os.getenv("CHANGEFEED_DEBOUNCE_SECONDS", "2"))
+# Com vários workers: intervalo de leitura do log no cache compartilhado e
+# por quanto tempo cada lote fica lá
+CHANGEFEED_POLL_SECONDS = float(os.getenv("CHANGEFEED_POLL_SECONDS", "1"))
+CHANGEFEED_LOG_TTL = float(os.getenv("CHANGEFEED_LOG_TTL", "3600"))
+
+TABLE = "appointments"
+
+_dirty = set()
+_refresh_task = None
+_follow_task = None
+stats = {"events": 0, "ignored": 0, "refreshes": 0, "last_event_at": None}
+
+
+def configured():
+    """O webhook só aceita eventos com CHANGEFEED_SECRET definido"""
+    return bool(CHANGEFEED_SECRET)
+
+
+def authorized(secret):
+    return configured() and hmac.compare_digest((secret or "").encode(), CHANGEFEED_SECRET.encode())
+
+
+def _tenant(record):
+    value = (record or {}).get(repository.TENANT_COLUMN)
+    return str(value) if value is not None else None
+
+
+def _project(record, columns):
+    return {column: record.get(column) for column in columns}
+
+
+def _add(changes, targets, row=None, row_id=None):
+    """Enfileira a mudança para cada loja alvo, preservando a ordem dos eventos"""
+    for target in targets:
+        batches = changes.setdefault(target, [])
+        upserts, deletes = batches[-1] if batches else (None, None)
+        if row is not None and not deletes and upserts is not None:
+            upserts.append(row)
+        elif row is None and deletes is not None:
+            deletes.append(row_id)
+        else:
+            batches.append(([row], []) if row is not None else ([], [row_id]))
+
+
+def _valid(event):
+    kind = event.get("type")
+    if event.get("table") != TABLE or kind not in ("INSERT", "UPDATE", "DELETE"):
+        return False
+    row = event.get("record") if kind != "DELETE" else None
+    previous = event.get("old_record") if kind != "INSERT" else None
+    return (row or previous or {}).get("id") is not None
+
+
+async def apply(events):
+    """Recebe eventos do webhook; devolve (aplicados, ignorados)
+
+    Com cache compartilhado (vários workers) os eventos vão para o log do
+    cache e cada worker, inclusive este, os aplica ao ler o log (`follow`).
+    """
+    valid = []
+    for event in events:
+        if _valid(event):
+            valid.append(event)
+            changefeed_events.inc(type=event["type"], outcome="applied")
+        else:
+            changefeed_events.inc(type=str(event.get("type")), outcome="ignored")
+
+    if valid:
+        if not (shared_cache.backend.shared and await _publish(valid)):
+            _apply(valid)
+        stats["last_event_at"] = time.monotonic()
+    stats["events"] += len(valid)
+    stats["ignored"] += len(events) - len(valid)
+    return len(valid), len(events) - len(valid)
+
+
+def _apply(events):
+    """Aplica eventos já validados nas cópias locais dos tenants carregados"""
+    changes = {}
+    for event in events:
+        kind = event["type"]
+        row = event.get("record") if kind != "DELETE" else None
+        previous = event.get("old_record") if kind != "INSERT" else None
+        if row is None:
+            if repository.TENANT_COLUMN in previous:
+                _add(changes, {_tenant(previous), None}, row_id=previous["id"])
+            else:
+                _add(changes, snapshots.tenants(), row_id=previous["id"])
+        else:
+            # Uma linha que mudou de salão sai do tenant antigo (a visão global só atualiza)
+            if previous is not None and repository.TENANT_COLUMN in previous and _tenant(previous) != _tenant(row):
+                _add(changes, {_tenant(previous)}, row_id=previous["id"])
+            _add(changes, {_tenant(row), None}, row=row)
+
+    # Só tenants já carregados: os demais fazem a carga completa na primeira leitura
+    for target, batches in changes.items():
+        data = snapshots.loaded(target)
+        if data is None:
+            continue
+        columns = [c.strip() for c in data.store.columns.split(",")]
+        for upserts, deletes in batches:
+            data.store.ingest([_project(row, columns) for row in upserts], deletes)
+        _dirty.add(target)
+    if _dirty:
+        _schedule_refresh()
+
+
+def _write_log(events):
+    seq = shared_cache.backend.incr("changefeed:seq")
+    shared_cache.backend.set(f"changefeed:{seq}", json.dumps(events).encode(), CHANGEFEED_LOG_TTL)
+
+
+async def _publish(events):
+    """Grava os eventos no log do cache compartilhado (numa thread); False se o backend falhou"""
+    try:
+        await asyncio.to_thread(_write_log, events)
+        return True
+    except SharedCacheError as e:
+        log.warning("change feed aplicado só neste worker: cache compartilhado indisponível", error=str(e))
+        return False
+
+
+async def follow():
+    """Aplica os eventos que qualquer worker publicou no log do cache compartilhado
+
+    As leituras do backend (bloqueantes com sqlite/Redis) rodam numa thread.
+    """
+    get = shared_cache.backend.get
+    last = None
+    misses = 0
+    while True:
+        try:
+            head = int(await asyncio.to_thread(get, "changefeed:seq") or 0)
+            if last is None:
+                # Eventos anteriores já estão na carga completa deste worker
+                last = head
+            while last < head:
+                data = await asyncio.to_thread(get, f"changefeed:{last + 1}")
+                if data is None:
+                    # Publicado entre o INCR e o SET: tenta na próxima volta;
+                    # ainda ausente depois disso, expirou ou se perdeu
+                    misses += 1
+                    if misses < 5:
+                        break
+                else:
+                    _apply(json.loads(data))
+                misses = 0
+                last += 1
+        except SharedCacheError as e:
+            log.warning("erro ao ler o log do change feed", error=str(e))
+        await asyncio.sleep(CHANGEFEED_POLL_SECONDS)
+
+
+def start():
+    global _follow_task
+    if CHANGEFEED_ENABLED and not configured():
+        log.error("change feed ligado sem CHANGEFEED_SECRET: o webhook vai recusar todos os eventos")
+    if CHANGEFEED_ENABLED and shared_cache.backend.shared and _follow_task is None:
+        _follow_task = asyncio.ensure_future(follow())
+
+
+async def stop():
+    global _follow_task
+    if _follow_task is not None:
+        _follow_task.cancel()
+        try:
+            await _follow_task
+        except asyncio.CancelledError:
+            pass
+        _follow_task = None
+
+
+def _schedule_refresh():
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh_later())
+
+
+async def _refresh_later():
+    # Eventos que chegam durante o recálculo entram na próxima volta
+    while _dirty:
+        await asyncio.sleep(CHANGEFEED_DEBOUNCE_SECONDS)
+        tenants = list(_dirty)
+        _dirty.clear()
+        stats["refreshes"] += 1
+        log.debug("recalculando após change feed", tenants=[str(t) for t in tenants])
+        await scheduler.refresh_tenants(tenants)
+
+
+def info():
+    last = stats["last_event_at"]
+    return {
+        **{key: value for key, value in stats.items() if key != "last_event_at"},
+        "enabled": CHANGEFEED_ENABLED,
+        "last_event_seconds_ago": round(time.monotonic() - last, 1) if last is not None else None,
+        "pending_tenants": [str(t) for t in _dirty],
+    }
@@ -0,0 +1,143 @@
+# customers.py - Índice de agregados por cliente (customer_email)
+#
+# Gasto total, número de visitas e data da última visita de cada cliente,
+# sobre os agendamentos confirmados. Segmentação e qualquer feature por
+# cliente consultam o índice em O(1) em vez de varrer os agendamentos por
+# usuário (que era O(usuários × agendamentos)).
+#
+# CustomerIndex é listener do AppointmentStore, como o rollup e os scores
+# (scoring.py): no event loop só enfileira as mudanças, e `refresh()`, que
+# roda numa thread (snapshots.customer_index), recalcula só os clientes que
+# mudaram. A passada completa fica para a carga inicial e as
+# ressincronizações completas.
+import threading
+from collections import deque
+from datetime import date
+
+from normalize import EPOCH, NO_DAY, epoch_day
+
+
+class CustomerStats:
+    __slots__ = ('spent', 'visits', 'last_visit')
+
+    def __init__(self):
+        self.spent = 0.0
+        self.visits = 0
+        self.last_visit = None  # dias desde 1970-01-01 (ver normalize.day)
+
+    def last_visit_days(self, today=None):
+        """Dias desde a última visita (365 se nunca visitou)"""
+        if self.last_visit is None:
+            return 365
+        return (today or date.today()).toordinal() - EPOCH - self.last_visit
+
+
+NO_VISITS = CustomerStats()
+
+
+def _stats(visits):
+    """CustomerStats de um cliente a partir de {id: (valor, dia)}"""
+    stats = CustomerStats()
+    stats.visits = len(visits)
+    stats.spent = sum(amount for amount, _ in visits.values())
+    last = max(day for _, day in visits.values())
+    stats.last_visit = last if last != NO_DAY else None
+    return stats
+
+
+class CustomerIndex:
+    """Agregados por cliente dos agendamentos confirmados de um tenant"""
+
+    def __init__(self):
+        # e-mail -> {id: (valor, dia)} das linhas confirmadas
+        self._visits = {}
+        self._dirty = set()
+        # e-mail -> CustomerStats; entradas são trocadas, nunca alteradas, então
+        # quem lê o índice numa thread não vê um cliente pela metade
+        self.by_email = {}
+        self.stats = {"full": 0, "incremental": 0, "updated": 0}
+        # Mudanças do AppointmentStore ainda não aplicadas (ver scoring.py)
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def reset(self, rows):
+        self._queue.clear()
+        self._queue.append(("reset", list(rows)))
+
+    def apply(self, old, new):
+        self._queue.append(("apply", old, new))
+
+    def get(self, email, default=None):
+        return self.by_email.get(email, default)
+
+    def __len__(self):
+        return len(self.by_email)
+
+    def refresh(self):
+        """Aplica a fila e recalcula os clientes afetados; devolve quantos recalculou"""
+        with self._lock:
+            full = False
+            while self._queue:
+                change = self._queue.popleft()
+                if change[0] == "reset":
+                    self._load(change[1])
+                    full = True
+                    continue
+                for row, sign in ((change[1], -1), (change[2], 1)):
+                    email = self._track(row, sign) if row is not None else None
+                    if email:
+                        self._dirty.add(email)
+            if full:
+                self.by_email = {email: _stats(visits) for email, visits in self._visits.items()}
+                self._dirty = set()
+                updated = len(self.by_email)
+                self.stats["full"] += 1
+            elif self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                for email in dirty:
+                    visits = self._visits.get(email)
+                    if visits:
+                        self.by_email[email] = _stats(visits)
+                    else:
+                        self.by_email.pop(email, None)
+                updated = len(dirty)
+                self.stats["incremental"] += 1
+            else:
+                return 0
+            self.stats["updated"] += updated
+            return updated
+
+    def _load(self, rows):
+        # Passada completa: cada data distinta é convertida uma vez
+        visits = {}
+        days = {}
+        for row in rows:
+            email = row.get('customer_email')
+            if not email or row.get('status') != 'confirmed':
+                continue
+            value = row.get('date')
+            day = days.get(value)
+            if day is None:
+                day = days[value] = epoch_day(value)
+            by_id = visits.get(email)
+            if by_id is None:
+                by_id = visits[email] = {}
+            by_id[row['id']] = (row.get('total_amount') or 0, day)
+        self._visits = visits
+
+    def _track(self, row, sign):
+        email = row.get('customer_email')
+        if not email or row.get('status') != 'confirmed':
+            return None
+        if sign > 0:
+            self._visits.setdefault(email, {})[row['id']] = (row.get('total_amount') or 0, epoch_day(row.get('date')))
+        else:
+            visits = self._visits.get(email)
+            if visits is not None:
+                visits.pop(row.get('id'), None)
+                if not visits:
+                    del self._visits[email]
+        return email
+
+    def info(self):
+        return {**self.stats, "customers": len(self.by_email), "pending": len(self._queue)}
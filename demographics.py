@@ -0,0 +1,83 @@
+# demographics.py - Contagem de colunas categóricas de `users` numa passada
+#
+# Um "agrupamento" é uma tupla de colunas: ('age_group',) conta uma dimensão,
+# ('age_group', 'spending_range') conta o cruzamento das duas. `count` faz uma
+# única varredura dos usuários para todos os agrupamentos pedidos, então
+# acrescentar dimensões ou cruzamentos não multiplica as passadas.
+#
+# Os resultados ficam num LRU indexado pela versão do snapshot de usuários
+# (UserTable.version): enquanto o conteúdo não muda, o pré-cálculo e os
+# cruzamentos pedidos sob demanda não varrem a tabela de novo.
+from collections import Counter, OrderedDict
+
+# Dimensões do payload de client-demographics (coluna -> rótulo)
+DIMENSIONS = {
+    'age_group': 'Idade',
+    'hair_type': 'Cabelo',
+    'visit_frequency': 'Frequência',
+    'spending_range': 'Gastos',
+}
+
+# Cruzamentos calculados junto com o payload de client-demographics
+CROSSTABS = [('age_group', 'spending_range')]
+
+# Colunas de `users` que a API lê (demografia + segmentação)
+USER_COLUMNS = ', '.join(['id', 'email', *DIMENSIONS])
+
+GROUP_BY_CACHE_SIZE = 64
+_cache = OrderedDict()
+
+
+class UserTable(list):
+    """Linhas de `users` com uma versão derivada do conteúdo das colunas lidas"""
+
+    def __init__(self, rows, columns=USER_COLUMNS):
+        super().__init__(rows)
+        names = [c.strip() for c in columns.split(',')]
+        self.version = hash(tuple(tuple(row.get(name) for name in names) for row in self))
+
+
+def count(users, groupings):
+    """{agrupamento: Counter {(valor, ...): usuários}} numa única passada
+
+    Usuários com alguma coluna do agrupamento vazia (ou 'Não informado') não
+    entram naquele agrupamento. Só os agrupamentos que não estão no cache para
+    a versão atual são contados. Os Counters podem vir do cache: não altere.
+    """
+    groupings = [tuple(grouping) for grouping in groupings]
+    version = getattr(users, 'version', None)
+    counters = {}
+    missing = []
+    for grouping in groupings:
+        cached = _cache.get((version, grouping)) if version is not None else None
+        if cached is None:
+            missing.append(grouping)
+        else:
+            _cache.move_to_end((version, grouping))
+            counters[grouping] = cached
+
+    if missing:
+        columns = sorted({column for grouping in missing for column in grouping})
+        fresh = {grouping: Counter() for grouping in missing}
+        for user in users:
+            values = {column: user.get(column) for column in columns}
+            for grouping, counter in fresh.items():
+                combination = tuple(values[column] for column in grouping)
+                if all(value and value != 'Não informado' for value in combination):
+                    counter[combination] += 1
+        counters.update(fresh)
+        if version is not None:
+            for grouping, counter in fresh.items():
+                _cache[(version, grouping)] = counter
+            while len(_cache) > GROUP_BY_CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return {grouping: counters[grouping] for grouping in groupings}
+
+
+def crosstab(users, rows, columns):
+    """Tabela cruzada {linha: {coluna: usuários}} de duas colunas categóricas"""
+    table = {}
+    for (row, column), n in count(users, [(rows, columns)])[(rows, columns)].items():
+        table.setdefault(row, {})[column] = n
+    return table
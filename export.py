@@ -0,0 +1,199 @@
+# export.py - Exportação em streaming (NDJSON/CSV) de agendamentos e agregados
+#
+# O intervalo [since, until] é percorrido em janelas de EXPORT_WINDOW_DAYS
+# dias; dentro de cada janela as linhas vêm do Supabase página a página
+# (repository.iter_pages). Nada guarda o intervalo inteiro em memória:
+#
+# - appointments: cada página é serializada e descartada;
+# - day: os totais de uma janela são emitidos assim que ela termina;
+# - service / customer: um acumulador por serviço / cliente (cresce com a
+#   base de clientes, não com o tamanho do intervalo), emitido no fim.
+#
+# As linhas saem agrupadas em blocos de ~EXPORT_CHUNK_BYTES. O StreamingResponse
+# só pede o próximo bloco depois de entregar o anterior ao servidor, então um
+# cliente lento segura a paginação no Supabase (backpressure) em vez de
+# acumular dados na API.
+import csv
+import io
+import json
+import os
+from datetime import date, timedelta
+
+import log
+import repository
+from sync import APPOINTMENT_COLUMNS
+
+EXPORT_WINDOW_DAYS = int(os.getenv("EXPORT_WINDOW_DAYS", "31"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+# Intervalo padrão quando `since` não é informado
+EXPORT_DEFAULT_DAYS = 365
+# Maior intervalo aceito (cada janela de EXPORT_WINDOW_DAYS é uma consulta)
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", str(3 * 366)))
+
+# Campos de cada exportação, na ordem das colunas do CSV.
+# `revenue` soma só os confirmados (como nos endpoints de analytics).
+FIELDS = {
+    "appointments": [c.strip() for c in APPOINTMENT_COLUMNS.split(",")],
+    "day": ["date", "appointments", "confirmed", "canceled", "revenue", "customers"],
+    "service": ["service", "appointments", "confirmed", "canceled", "revenue", "customers"],
+    "customer": ["customer_email", "appointments", "confirmed", "canceled", "revenue", "first_visit", "last_visit"],
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def windows(since, until, days=None):
+    """Janelas [início, fim] (YYYY-MM-DD) de `days` dias cobrindo [since, until]"""
+    days = days or EXPORT_WINDOW_DAYS
+    start, end = date.fromisoformat(since), date.fromisoformat(until)
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        yield start.isoformat(), stop.isoformat()
+        start = stop + timedelta(days=1)
+
+
+async def _pages(start, end, status, tenant):
+    build = repository.appointments_query(since=start, until=end, status=status, tenant=tenant)
+    async for page in repository.iter_pages(build, APPOINTMENT_COLUMNS):
+        yield page
+
+
+class _Totals:
+    __slots__ = ("appointments", "confirmed", "canceled", "revenue", "customers", "first_visit", "last_visit")
+
+    def __init__(self):
+        self.appointments = 0
+        self.confirmed = 0
+        self.canceled = 0
+        self.revenue = 0.0
+        self.customers = set()
+        self.first_visit = None
+        self.last_visit = None
+
+    def add(self, row, customers=True):
+        self.appointments += 1
+        status = row.get("status")
+        if status == "confirmed":
+            self.confirmed += 1
+            self.revenue += row.get("total_amount") or 0
+        elif status == "canceled":
+            self.canceled += 1
+        if customers and row.get("customer_email"):
+            self.customers.add(row["customer_email"])
+        day = row.get("date")
+        if day:
+            if self.first_visit is None or day < self.first_visit:
+                self.first_visit = day
+            if self.last_visit is None or day > self.last_visit:
+                self.last_visit = day
+
+    def record(self, key_field, key):
+        return {
+            key_field: key,
+            "appointments": self.appointments,
+            "confirmed": self.confirmed,
+            "canceled": self.canceled,
+            "revenue": round(self.revenue, 2),
+            "customers": len(self.customers),
+            "first_visit": self.first_visit,
+            "last_visit": self.last_visit,
+        }
+
+
+async def _appointments(since, until, status, tenant):
+    fields = FIELDS["appointments"]
+    for start, end in windows(since, until):
+        async for page in _pages(start, end, status, tenant):
+            for row in page:
+                yield {field: row.get(field) for field in fields}
+
+
+async def _by_day(since, until, status, tenant):
+    for start, end in windows(since, until):
+        days = {}
+        async for page in _pages(start, end, status, tenant):
+            for row in page:
+                day = row.get("date")
+                if day:
+                    totals = days.get(day)
+                    if totals is None:
+                        totals = days[day] = _Totals()
+                    totals.add(row)
+        for day in sorted(days):
+            yield days[day].record("date", day)
+
+
+async def _by_key(field, since, until, status, tenant):
+    groups = {}
+    # Por cliente o conjunto de clientes distintos seria ele mesmo
+    track_customers = field != "customer_email"
+    for start, end in windows(since, until):
+        async for page in _pages(start, end, status, tenant):
+            for row in page:
+                key = row.get(field) or ""
+                totals = groups.get(key)
+                if totals is None:
+                    totals = groups[key] = _Totals()
+                totals.add(row, customers=track_customers)
+    for key in sorted(groups):
+        yield groups[key].record(field, key)
+
+
+def records(grouping, since, until, status=None, tenant=None):
+    """Async generator dos registros de uma exportação"""
+    if grouping == "appointments":
+        return _appointments(since, until, status, tenant)
+    if grouping == "day":
+        return _by_day(since, until, status, tenant)
+    if grouping == "service":
+        return _by_key("service", since, until, status, tenant)
+    if grouping == "customer":
+        return _by_key("customer_email", since, until, status, tenant)
+    raise ValueError(grouping)
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+async def _lines(grouping, fmt, source):
+    fields = FIELDS[grouping]
+    if fmt == "csv":
+        yield _csv_line(fields)
+    try:
+        async for record in source:
+            if fmt == "csv":
+                yield _csv_line([record.get(field) for field in fields])
+            else:
+                yield json.dumps({field: record.get(field) for field in fields}, ensure_ascii=False) + "\n"
+    except Exception as e:
+        # Os headers (200) já foram enviados. NDJSON avisa no próprio corpo; CSV
+        # não tem como marcar o erro, então a exceção aborta a transferência
+        # chunked e o cliente vê a resposta incompleta em vez de um arquivo
+        # que parece inteiro. O detalhe do erro fica só no log
+        log.error("exportação interrompida", grouping=grouping, error=str(e))
+        if fmt == "csv":
+            raise
+        yield json.dumps({"error": "Exportação interrompida, tente novamente"}, ensure_ascii=False) + "\n"
+
+
+async def stream(grouping, fmt, since, until, status=None, tenant=None, chunk_bytes=None):
+    """Corpo da resposta em blocos de ~`chunk_bytes` bytes"""
+    chunk_bytes = chunk_bytes or EXPORT_CHUNK_BYTES
+    chunk, size = [], 0
+    async for line in _lines(grouping, fmt, records(grouping, since, until, status, tenant)):
+        data = line.encode("utf-8")
+        chunk.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def default_range(today=None):
+    today = today or date.today()
+    return (today - timedelta(days=EXPORT_DEFAULT_DAYS)).isoformat(), today.isoformat()
@@ -0,0 +1,153 @@
+# forecasting.py - Previsão de demanda sobre as séries diárias do rollup
+#
+# Séries: receita e número de agendamentos confirmados por dia (dias sem
+# movimento entram como zero), até ontem. Dois modelos:
+#
+# - seasonal naive: cada dia da próxima semana repete o mesmo dia da semana
+#   anterior;
+# - Holt-Winters aditivo com sazonalidade semanal (m=7), com alfa/beta/gama
+#   escolhidos por grid search no erro de um passo.
+#
+# Os dois são avaliados num backtest de origem móvel (últimas semanas): o de
+# menor erro no total semanal é usado, o intervalo de previsão vem dos erros
+# observados no backtest e a confiança é 1 - MAPE semanal.
+#
+# O resultado fica em cache até chegar um dia novo (ou mudar algum dia já
+# fechado no rollup), então a requisição é só uma consulta ao dicionário.
+import weakref
+from datetime import date, timedelta
+from itertools import product
+
+SEASON = 7
+HORIZON = 7
+HISTORY_DAYS = 180
+BACKTEST_WEEKS = 4
+
+_ALPHAS = (0.1, 0.3, 0.5)
+_BETAS = (0.0, 0.05, 0.15)
+_GAMMAS = (0.1, 0.3)
+
+# rollup -> ((dia, history_version), resultado)
+_cache = weakref.WeakKeyDictionary()
+
+
+def daily_series(rollup, end, days=HISTORY_DAYS):
+    """Listas (receita, agendamentos) dos `days` dias que terminam em `end`"""
+    start = end - timedelta(days=days - 1)
+    totals = rollup.daily_totals(start.isoformat(), 'confirmed')
+    revenue, counts = [], []
+    for offset in range(days):
+        count, amount = totals.get((start + timedelta(days=offset)).isoformat(), (0, 0.0))
+        revenue.append(amount)
+        counts.append(count)
+    return revenue, counts
+
+
+def seasonal_naive(series, horizon=HORIZON, season=SEASON):
+    last = series[-season:]
+    return [last[h % season] for h in range(horizon)]
+
+
+def _holt_winters_run(series, alpha, beta, gamma, season):
+    level = sum(series[:season]) / season
+    trend = (sum(series[season:2 * season]) - sum(series[:season])) / season ** 2
+    seasonals = [y - level for y in series[:season]]
+    sse = 0.0
+    for t, y in enumerate(series):
+        s = seasonals[t % season]
+        error = y - (level + trend + s)
+        sse += error * error
+        new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        seasonals[t % season] = gamma * (y - new_level) + (1 - gamma) * s
+        level = new_level
+    return sse, level, trend, seasonals
+
+
+def holt_winters(series, horizon=HORIZON, season=SEASON):
+    """Holt-Winters aditivo; precisa de pelo menos duas temporadas"""
+    best = None
+    for alpha, beta, gamma in product(_ALPHAS, _BETAS, _GAMMAS):
+        run = _holt_winters_run(series, alpha, beta, gamma, season)
+        if best is None or run[0] < best[0]:
+            best = run
+    _, level, trend, seasonals = best
+    n = len(series)
+    return [
+        max(0.0, level + h * trend + seasonals[(n + h - 1) % season])
+        for h in range(1, horizon + 1)
+    ]
+
+
+MODELS = {"holt_winters": holt_winters, "seasonal_naive": seasonal_naive}
+
+
+def backtest(series, model, weeks=BACKTEST_WEEKS):
+    """Erros (previsto - real) do total semanal em origens móveis"""
+    errors = []
+    for week in range(weeks, 0, -1):
+        origin = len(series) - week * HORIZON
+        if origin < 2 * SEASON:
+            continue
+        predicted = sum(model(series[:origin]))
+        actual = sum(series[origin:origin + HORIZON])
+        errors.append((predicted, actual))
+    return errors
+
+
+def forecast(series):
+    """Melhor modelo no backtest, previsão diária, intervalo e confiança"""
+    if len(series) < 2 * SEASON:
+        return None
+
+    results = []
+    for name, model in MODELS.items():
+        errors = backtest(series, model)
+        abs_errors = [abs(p - a) for p, a in errors]
+        mae = sum(abs_errors) / len(abs_errors) if abs_errors else float('inf')
+        results.append((mae, name, model, errors, abs_errors))
+    mae, name, model, errors, abs_errors = min(results, key=lambda r: (r[0], r[1]))
+
+    daily = model(series)
+    total = sum(daily)
+    if abs_errors:
+        # Intervalo empírico: maior erro visto no backtest
+        spread = max(abs_errors)
+        actual_total = sum(a for _, a in errors)
+        mape = sum(abs_errors) / actual_total if actual_total else 1.0
+        confidence = round(max(0.0, min(1.0, 1 - mape)), 2)
+    else:
+        spread = total
+        confidence = 0.5
+    return {
+        "model": name,
+        "daily": daily,
+        "total": total,
+        "interval": (max(0.0, total - spread), total + spread),
+        "confidence": confidence,
+    }
+
+
+def demand_forecast(rollup, today=None):
+    """Previsão da próxima semana (hoje + 6 dias) a partir do rollup, com cache
+
+    Devolve None se ainda não há histórico suficiente (duas semanas).
+    """
+    today = today or date.today()
+    key = (today, rollup.history_version)
+    cached = _cache.get(rollup)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    revenue, counts = daily_series(rollup, today - timedelta(days=1))
+    # Dias antes do primeiro agendamento não são "zero vendas"
+    first = next((i for i, count in enumerate(counts) if count), len(counts))
+    revenue, counts = revenue[first:], counts[first:]
+
+    result = None
+    revenue_forecast = forecast(revenue)
+    if revenue_forecast is not None:
+        result = {"revenue": revenue_forecast, "appointments": forecast(counts), "start": today}
+
+    _cache[rollup] = (key, result)
+    return result
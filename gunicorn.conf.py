@@ -0,0 +1,25 @@
+# gunicorn.conf.py - Modo de produção: vários workers uvicorn, sem reload
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# WEB_CONCURRENCY define o número de workers (padrão: 1). Só vale aumentar em
+# planos com mais de uma CPU, um por núcleo: num container, cpu_count() mostra
+# os núcleos do host e não a cota, e workers a mais só disputam a mesma CPU e
+# multiplicam a memória das cópias locais. Com mais de um worker o cache
+# compartilhado passa a ser o SQLite local (CACHE_BACKEND=sqlite, ver
+# shared_cache.py) se nenhum outro foi escolhido, para o pré-cálculo rodar uma
+# vez só e ser servido por todos.
+# Desenvolvimento: uvicorn main:app --reload
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Primeira carga de um tenant grande pode demorar
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+if workers > 1:
+    # Lido pelos workers ao importar a app (depois do fork)
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
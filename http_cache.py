@@ -0,0 +1,158 @@
+# http_cache.py - Cache de respostas HTTP com ETag, 304 e Cache-Control
+#
+# Middleware ASGI para as rotas GET de analytics. A resposta de cada
+# (caminho, query) fica guardada junto com a versão dos dados em que foi
+# gerada (`version(scope)`, ex.: geração do pré-cálculo + watermark da
+# sincronização do tenant da requisição).
+# Enquanto a versão não muda e a entrada tem menos de `max-age` segundos:
+#
+# - `If-None-Match` igual ao ETag -> 304 sem chamar o handler (nem o banco);
+# - senão o corpo guardado é devolvido direto, já comprimido se o cliente
+#   aceitar gzip (ou brotli, se o pacote `brotli` estiver instalado).
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Corpos menores que isso não compensam comprimir
+MIN_COMPRESS_SIZE = 1024
+
+# Headers que o middleware recalcula ao servir do cache
+_SKIP_HEADERS = {b"content-length", b"content-encoding", b"etag", b"cache-control", b"vary"}
+
+# Contadores de todas as instâncias (expostos em /api/debug/cache)
+stats = {"hits": 0, "not_modified": 0, "misses": 0}
+
+
+class _Entry:
+    __slots__ = ("version", "etag", "body", "headers", "created", "encoded", "route")
+
+    def __init__(self, version, body, headers, route=None):
+        self.version = version
+        # Rota do roteador que gerou a resposta (label das métricas nos hits)
+        self.route = route
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.body = body
+        self.headers = headers
+        self.created = time.monotonic()
+        self.encoded = {}
+
+    def encode(self, encoding):
+        body = self.encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(self.body)
+            else:
+                body = gzip.compress(self.body, compresslevel=6)
+            self.encoded[encoding] = body
+        return body
+
+
+class ResponseCacheMiddleware:
+    """`max_age` mapeia prefixo de rota -> segundos (o prefixo mais longo vence)
+
+    Um prefixo com None fica fora do cache, mesmo dentro de um prefixo cacheado.
+    """
+
+    def __init__(self, app, version, max_age, max_entries=256):
+        self.app = app
+        self.version = version
+        self.max_age = sorted(max_age.items(), key=lambda item: -len(item[0]))
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _route_max_age(self, path):
+        for prefix, seconds in self.max_age:
+            if path.startswith(prefix):
+                return seconds
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        max_age = self._route_max_age(scope["path"])
+        if max_age is None:
+            return await self.app(scope, receive, send)
+
+        headers = {k.lower(): v for k, v in scope["headers"]}
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        accept_encoding = headers.get(b"accept-encoding", b"").decode("latin-1")
+        key = (scope["path"], scope["query_string"])
+        version = self.version(scope)
+
+        entry = self._entries.get(key)
+        if entry is not None and (entry.version != version or time.monotonic() - entry.created > max_age):
+            entry = None
+
+        if entry is None:
+            stats["misses"] += 1
+            entry = await self._capture(scope, receive, send, version)
+            if entry is None:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            if entry.route is not None:
+                scope["route"] = entry.route
+
+        remaining = max(0, int(max_age - (time.monotonic() - entry.created)))
+        await self._send(send, entry, remaining, if_none_match, accept_encoding)
+
+    async def _capture(self, scope, receive, send, version):
+        """Roda o handler e guarda a resposta; respostas não-200 passam direto"""
+        start = None
+        chunks = []
+        passthrough = False
+
+        async def capture(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+            elif passthrough:
+                await send(message)
+            else:
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if passthrough or start is None:
+            return None
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in _SKIP_HEADERS]
+        return _Entry(version, b"".join(chunks), headers, scope.get("route"))
+
+    async def _send(self, send, entry, max_age, if_none_match, accept_encoding):
+        headers = list(entry.headers) + [
+            (b"etag", entry.etag.encode()),
+            (b"cache-control", f"public, max-age={max_age}".encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if entry.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            stats["not_modified"] += 1
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        body = entry.body
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None and "br" in accept_encoding:
+                body = entry.encode("br")
+                headers.append((b"content-encoding", b"br"))
+            elif "gzip" in accept_encoding:
+                body = entry.encode("gzip")
+                headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
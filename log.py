@@ -0,0 +1,60 @@
+# log.py - Logger estruturado (uma linha JSON por evento) com nível configurável
+#
+# Substitui os print() do caminho quente. Em produção o nível padrão (INFO)
+# descarta os eventos de debug antes de formatar qualquer coisa; quem precisa
+# calcular um campo caro testa `enabled()` antes.
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("margareth")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def enabled(level=logging.DEBUG):
+    return logger.isEnabledFor(level)
+
+
+def _log(level, event, fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def debug(event, **fields):
+    _log(logging.DEBUG, event, fields)
+
+
+def info(event, **fields):
+    _log(logging.INFO, event, fields)
+
+
+def warning(event, **fields):
+    _log(logging.WARNING, event, fields)
+
+
+def error(event, **fields):
+    _log(logging.ERROR, event, fields)
@@ -0,0 +1,184 @@
+# metrics.py - Métricas no formato de texto do Prometheus (GET /metrics)
+#
+# Registro próprio e mínimo (sem dependência do prometheus_client): counters e
+# histogramas com labels, mais coletores chamados na hora da exportação para
+# expor contadores que já existem em outros módulos (cache, sincronização).
+#
+# - http_request_duration_seconds: latência por rota (MetricsMiddleware);
+# - supabase_*: queries, linhas, bytes e latência por tabela (repository.py),
+#   retries, hedges e recusas do circuit breaker (resilience.py);
+# - precompute_job_duration_seconds: tempo de cálculo de cada payload;
+# - endpoint_serves_total / endpoint_fallbacks_total: quanto cada payload cai
+#   no fallback fixo;
+# - changefeed_events_total: eventos recebidos pelo webhook (changefeed.py);
+# - scoring_customers_rescored_total: clientes recalculados pelo scoring de
+#   churn/CLV, em cálculo completo ou incremental (scoring.py).
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            # Contagem por bucket (não cumulativa) + soma + total
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield f"{self.name}_bucket", _labels(self.labelnames, key, [('le', _number(bound))]), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, key), total
+            yield f"{self.name}_count", _labels(self.labelnames, key), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """Registra `collect()` -> [(nome, tipo, help, {labels: valor})], lido a cada exportação"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        for collect in self._collectors:
+            for name, kind, help, values in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    names = [label for label, _ in labels]
+                    lines.append(f"{name}{_labels(names, [v for _, v in labels])} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota", ("route", "method", "status"))
+supabase_queries = registry.counter(
+    "supabase_queries_total", "Queries enviadas ao Supabase", ("table", "outcome"))
+supabase_rows = registry.counter(
+    "supabase_rows_fetched_total", "Linhas recebidas do Supabase", ("table",))
+supabase_bytes = registry.counter(
+    "supabase_bytes_received_total", "Bytes recebidos do Supabase (corpo da resposta)", ("table",))
+supabase_latency = registry.histogram(
+    "supabase_query_duration_seconds", "Latência das queries ao Supabase por tabela", ("table",))
+supabase_retries = registry.counter(
+    "supabase_retries_total", "Tentativas repetidas após falha transitória", ("table",))
+supabase_hedges = registry.counter(
+    "supabase_hedged_requests_total", "Requisições hedged e qual tentativa respondeu primeiro", ("table", "winner"))
+breaker_rejections = registry.counter(
+    "supabase_circuit_rejections_total", "Chamadas recusadas com o circuit breaker aberto", ("table",))
+job_latency = registry.histogram(
+    "precompute_job_duration_seconds", "Duração de cada cálculo de payload (precompute.py)", ("job", "outcome"))
+endpoint_serves = registry.counter(
+    "endpoint_serves_total", "Payloads servidos por endpoint", ("endpoint",))
+endpoint_fallbacks = registry.counter(
+    "endpoint_fallbacks_total", "Payloads servidos com o fallback fixo", ("endpoint", "reason"))
+changefeed_events = registry.counter(
+    "changefeed_events_total", "Eventos de mudança recebidos pelo webhook", ("type", "outcome"))
+scoring_rescored = registry.counter(
+    "scoring_customers_rescored_total", "Clientes recalculados pelo scoring de churn/CLV", ("mode",))
+
+
+class MetricsMiddleware:
+    """Mede a latência de cada requisição HTTP (inclusive as servidas do cache HTTP)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def capture(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            # Label é o template da rota (/api/items/{id}), não o caminho: o que
+            # não casou com nenhuma rota vira um único label, para a cardinalidade
+            # não crescer com URLs arbitrárias. O cache HTTP repõe a rota nos hits
+            route = scope.get("route")
+            http_latency.observe(time.perf_counter() - started, route=getattr(route, "path", "unmatched"),
+                                 method=scope["method"], status=status)
@@ -0,0 +1,62 @@
+# normalize.py - Normalização de datas e horários com cache LRU
+#
+# Os agendamentos repetem as mesmas poucas centenas de datas ('YYYY-MM-DD') e
+# horários ('HH:MM:SS'). Cada string distinta é convertida uma única vez e os
+# campos derivados (dia desde 1970-01-01, dia da semana, hora) ficam num cache
+# LRU limitado a NORMALIZE_CACHE_SIZE entradas, compartilhado pelo rollup
+# diário (rollup.py), pelo índice por cliente (customers.py), pelos scores
+# (scoring.py) e pelo forecasting.
+import os
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple
+
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "4096"))
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+# Dia de linhas sem data válida: fica antes de qualquer `since`
+NO_DAY = -2**31
+
+
+class Day(NamedTuple):
+    iso: str      # 'YYYY-MM-DD'
+    epoch: int    # dias desde 1970-01-01
+    weekday: int  # 0=segunda
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def day(value):
+    """'YYYY-MM-DD' (ou timestamp ISO) -> Day, ou None se vazio/inválido"""
+    try:
+        parsed = date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+    return Day(parsed.isoformat(), parsed.toordinal() - EPOCH, parsed.weekday())
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def hour(value):
+    """'HH:MM[:SS]' -> hora, ou -1 se vazio/inválido"""
+    try:
+        return int(value.split(':')[0])
+    except (AttributeError, ValueError):
+        return -1
+
+
+def epoch_day(value):
+    """'YYYY-MM-DD' -> dias desde 1970-01-01 (NO_DAY se vazio/inválido)"""
+    parsed = day(value)
+    return parsed.epoch if parsed is not None else NO_DAY
+
+
+def iso_day(epoch):
+    """Inverso de `day(...).epoch`"""
+    return date.fromordinal(epoch + EPOCH).isoformat()
+
+
+def info():
+    return {
+        name: {"hits": stats.hits, "misses": stats.misses, "size": stats.currsize, "max_size": stats.maxsize}
+        for name, stats in [("day", day.cache_info()), ("hour", hour.cache_info())]
+    }
@@ -0,0 +1,332 @@
+# precompute.py - Recalculo periódico dos payloads do dashboard em background
+#
+# Cada payload é registrado como um job (`@job("business-stats")`). Um loop
+# iniciado no lifespan da app recalcula todos a cada PRECOMPUTE_INTERVAL
+# segundos; os handlers servem o último resultado pronto. Se o resultado não
+# existe ainda, ou passou de PRECOMPUTE_MAX_AGE (o loop parou, por exemplo),
+# o handler calcula na hora. Um job que falha mantém o último resultado bom,
+# que continua sendo servido (com `Warning: 110`) enquanto o recálculo falhar;
+# o fallback fixo de main.py só aparece se nunca houve um cálculo bem-sucedido.
+#
+# Os resultados são por tenant (salão). O loop recalcula só os tenants que
+# tiveram requisição nos últimos PRECOMPUTE_TENANT_IDLE segundos, inclusive a
+# visão global (tenant None, quando habilitada em snapshots.py).
+#
+# Com vários workers e um cache compartilhado (shared_cache.py, CACHE_BACKEND
+# sqlite/redis) só o worker que detém o lease de líder roda o recálculo
+# periódico; os resultados, as gerações e os tenants ativos ficam no cache e os
+# demais workers leem de lá (no máximo a cada PRECOMPUTE_SHARED_CHECK_SECONDS).
+# As chamadas ao backend (sqlite/Redis são bloqueantes) rodam numa thread
+# (`asyncio.to_thread`); a geração do tenant, lida a cada resposta com ETag, é uma cópia
+# local renovada em background com o mesmo intervalo.
+# Um worker só calcula por conta própria se o resultado compartilhado não
+# existe ou passou de PRECOMPUTE_MAX_AGE (o líder caiu, por exemplo).
+import asyncio
+import json
+import os
+import socket
+import time
+from datetime import datetime
+
+import log
+import shared_cache
+from metrics import job_latency
+from shared_cache import SharedCacheError
+
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "1") == "1"
+PRECOMPUTE_INTERVAL = float(os.getenv("PRECOMPUTE_INTERVAL", "60"))
+PRECOMPUTE_MAX_AGE = float(os.getenv("PRECOMPUTE_MAX_AGE", str(PRECOMPUTE_INTERVAL * 3)))
+PRECOMPUTE_TENANT_IDLE = float(os.getenv("PRECOMPUTE_TENANT_IDLE", "3600"))
+PRECOMPUTE_SHARED_CHECK_SECONDS = float(os.getenv("PRECOMPUTE_SHARED_CHECK_SECONDS", "1"))
+
+
+class Result:
+    __slots__ = ("payload", "computed_at", "duration", "created", "checked")
+
+    def __init__(self, payload, duration, computed_at=None, created=None):
+        self.payload = payload
+        self.computed_at = computed_at or datetime.now()
+        self.duration = duration
+        # time.time() do cálculo: comparável entre workers
+        self.created = created or time.time()
+        # Última vez que o cache compartilhado foi consultado para esta chave
+        self.checked = time.time()
+
+    def age(self):
+        return time.time() - self.created
+
+    def dumps(self):
+        return json.dumps({"payload": self.payload, "computedAt": self.computed_at.isoformat(),
+                           "duration": self.duration, "created": self.created}).encode()
+
+    @classmethod
+    def loads(cls, data):
+        entry = json.loads(data)
+        return cls(entry["payload"], entry["duration"], datetime.fromisoformat(entry["computedAt"]), entry["created"])
+
+
+class Scheduler:
+    def __init__(self, interval=PRECOMPUTE_INTERVAL, max_age=PRECOMPUTE_MAX_AGE,
+                 tenant_idle=PRECOMPUTE_TENANT_IDLE, shared=None):
+        self.interval = interval
+        self.max_age = max_age
+        self.tenant_idle = tenant_idle
+        # Backend de shared_cache.py; o de memória não é compartilhado (None)
+        self.shared = shared if shared is not None and shared.shared else None
+        self.jobs = {}
+        # Resultados, erros e cálculos em andamento indexados por (job, tenant)
+        self.results = {}
+        self.errors = {}
+        self._inflight = {}
+        # tenant -> instante (time.time) da última requisição e da última
+        # vez que foi anunciado no cache compartilhado
+        self._tenants = {}
+        self._announced = {}
+        self._task = None
+        self.leading = self.shared is None
+        # Geração de cada tenant: o valor do contador no último payload que
+        # mudou (nunca se repete, nem depois que o tenant sai e volta)
+        self._generation = 0
+        self._generations = {}
+        # Com cache compartilhado: tenant -> (cópia local, lida em time.monotonic)
+        self._shared_generations = {}
+        self._generation_tasks = {}
+
+    @property
+    def owner(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def generation(self, tenant=None):
+        """Muda quando algum payload do tenant muda; compõe o ETag (http_cache.py)
+
+        Com cache compartilhado devolve a cópia local, sem I/O: se passou de
+        PRECOMPUTE_SHARED_CHECK_SECONDS, agenda a releitura em background.
+        """
+        if self.shared is None:
+            return self._generations.get(tenant, 0)
+        value, checked = self._shared_generations.get(tenant, (0, 0.0))
+        task = self._generation_tasks.get(tenant)
+        if time.monotonic() - checked > PRECOMPUTE_SHARED_CHECK_SECONDS and (task is None or task.done()):
+            try:
+                self._generation_tasks[tenant] = asyncio.get_running_loop().create_task(
+                    self._read_generation(tenant))
+            except RuntimeError:
+                # Fora do event loop (scripts): fica com a cópia local
+                pass
+        return value
+
+    async def _read_generation(self, tenant):
+        data = await self._shared_call("get", self._shared_key("generation", tenant))
+        value = int(data) if data is not None else self._shared_generations.get(tenant, (0, 0.0))[0]
+        self._shared_generations[tenant] = (value, time.monotonic())
+
+    async def _shared_call(self, operation, *args):
+        """Chama o backend compartilhado numa thread; em caso de falha registra e devolve None"""
+        try:
+            return await asyncio.to_thread(getattr(self.shared, operation), *args)
+        except SharedCacheError as e:
+            log.warning("cache compartilhado indisponível", operation=operation, error=str(e))
+            return None
+
+    @staticmethod
+    def _shared_key(name, tenant):
+        return f"precompute:{name}:{'' if tenant is None else tenant}"
+
+    async def _leader(self):
+        """Tenta obter/renovar o lease de líder (sem cache compartilhado: sempre líder)"""
+        if self.shared is not None:
+            acquired = await self._shared_call("acquire", "precompute:leader", self.owner, max(self.interval * 3, 30))
+            # Backend fora do ar: cada worker segue calculando o próprio
+            self.leading = acquired is None or acquired
+        return self.leading
+
+    def job(self, name):
+        """Decorator: registra `async def compute(tenant)` como o job `name`"""
+        def register(compute):
+            self.jobs[name] = compute
+            return compute
+        return register
+
+    async def refresh(self, name, tenant=None):
+        """Recalcula um job; chamadas concorrentes compartilham o mesmo cálculo"""
+        key = (name, tenant)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._run(name, tenant))
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, name, tenant):
+        key = (name, tenant)
+        started = time.perf_counter()
+        try:
+            payload = await self.jobs[name](tenant)
+        except Exception as e:
+            job_latency.observe(time.perf_counter() - started, job=name, outcome="error")
+            self.errors[key] = f"{datetime.now().isoformat()} {e}"
+            raise
+        job_latency.observe(time.perf_counter() - started, job=name, outcome="ok")
+        previous = self.results.get(key)
+        changed = previous is None or previous.payload != payload
+        if changed:
+            self._generation += 1
+            self._generations[tenant] = self._generation
+        result = self.results[key] = Result(payload, time.perf_counter() - started)
+        self.errors.pop(key, None)
+        if self.shared is not None:
+            try:
+                data = result.dumps()
+            except (TypeError, ValueError) as e:
+                log.warning("payload não serializável, não compartilhado", job=name, error=str(e))
+            else:
+                await self._shared_call("set", self._shared_key(name, tenant), data, self.max_age * 2)
+                if changed:
+                    generation = await self._shared_call("incr", self._shared_key("generation", tenant))
+                    if generation is not None:
+                        self._shared_generations[tenant] = (generation, time.monotonic())
+        return result
+
+    async def _lookup(self, name, tenant):
+        """Resultado local ou, se mais novo, o do cache compartilhado"""
+        key = (name, tenant)
+        result = self.results.get(key)
+        if self.shared is None or (result is not None and time.time() - result.checked < PRECOMPUTE_SHARED_CHECK_SECONDS):
+            return result
+        data = await self._shared_call("get", self._shared_key(name, tenant))
+        if data is not None:
+            shared = Result.loads(data)
+            if result is None or shared.created > result.created:
+                result = self.results[key] = shared
+        if result is not None:
+            result.checked = time.time()
+        return result
+
+    async def _touch(self, tenant):
+        now = time.time()
+        self._tenants[tenant] = now
+        # Anuncia o tenant para o líder (que pode estar em outro worker)
+        if self.shared is not None and now - self._announced.get(tenant, 0) > self.tenant_idle / 10:
+            self._announced[tenant] = now
+            tenants = {"" if key is None else key: seen for key, seen in (await self._shared_tenants()).items()}
+            tenants["" if tenant is None else tenant] = now
+            await self._shared_call("set", "precompute:tenants", json.dumps(tenants).encode(), self.tenant_idle)
+
+    async def _shared_tenants(self):
+        """Tenants ativos anunciados pelos workers (a visão global vai como "")"""
+        data = await self._shared_call("get", "precompute:tenants")
+        return {key or None: seen for key, seen in json.loads(data).items()} if data else {}
+
+    async def get(self, name, tenant=None):
+        """Último resultado de `name` para o tenant, recalculando se não há ou está velho"""
+        await self._touch(tenant)
+        result = await self._lookup(name, tenant)
+        if result is None or result.age() > self.max_age:
+            try:
+                result = await self.refresh(name, tenant)
+            except Exception as e:
+                if result is None:
+                    raise
+                log.warning("recálculo falhou, servindo último resultado bom", job=name, tenant=tenant,
+                            age_seconds=round(result.age()), error=str(e))
+        return result
+
+    async def stale(self, names, tenant=None):
+        """Os de `names` sem resultado para o tenant ou com um mais velho que max_age"""
+        results = await asyncio.gather(*(self._lookup(name, tenant) for name in names))
+        return [name for name, result in zip(names, results) if result is None or result.age() > self.max_age]
+
+    async def serve(self, name, response=None, tenant=None):
+        """Payload de `name` com os headers X-Computed-At / X-Refresh-Duration-Ms"""
+        result = await self.get(name, tenant)
+        if response is not None:
+            response.headers["X-Computed-At"] = result.computed_at.isoformat()
+            response.headers["X-Refresh-Duration-Ms"] = f"{result.duration * 1000:.1f}"
+            if result.age() > self.max_age:
+                response.headers["Warning"] = '110 - "Response is Stale"'
+        return result.payload
+
+    async def active_tenants(self):
+        """Tenants com requisição recente; os ociosos deixam de ser recalculados"""
+        now = time.time()
+        if self.shared is not None:
+            for tenant, seen in (await self._shared_tenants()).items():
+                if seen > self._tenants.get(tenant, 0):
+                    self._tenants[tenant] = seen
+        for tenant, seen in list(self._tenants.items()):
+            if now - seen > self.tenant_idle:
+                del self._tenants[tenant]
+                self._announced.pop(tenant, None)
+                self._generations.pop(tenant, None)
+                self._shared_generations.pop(tenant, None)
+                self._generation_tasks.pop(tenant, None)
+                for key in [key for key in self.results if key[1] == tenant]:
+                    del self.results[key]
+                    self.errors.pop(key, None)
+        return list(self._tenants)
+
+    async def refresh_all(self):
+        await self._refresh_keys([(name, tenant) for tenant in await self.active_tenants() for name in self.jobs])
+
+    async def refresh_tenants(self, tenants):
+        """Recalcula na hora os jobs dos tenants ativos em `tenants` (ex.: mudança via change feed)
+
+        Com cache compartilhado só o líder recalcula; os outros workers leem o resultado dele.
+        """
+        if not await self._leader():
+            return
+        active = await self.active_tenants()
+        await self._refresh_keys([(name, tenant) for tenant in tenants if tenant in active for name in self.jobs])
+
+    async def _refresh_keys(self, keys):
+        results = await asyncio.gather(*(self.refresh(*key) for key in keys), return_exceptions=True)
+        for (name, tenant), result in zip(keys, results):
+            if isinstance(result, Exception):
+                log.error("erro no pré-cálculo", job=name, tenant=tenant, error=str(result))
+
+    async def _loop(self):
+        while True:
+            started = time.perf_counter()
+            if await self._leader():
+                await self.refresh_all()
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def info(self, tenant=None):
+        return {
+            "running": self._task is not None,
+            "leader": self.leading,
+            "owner": self.owner,
+            "shared": await self._shared_call("info") if self.shared is not None else None,
+            "interval": self.interval,
+            "tenants": [str(t) for t in self._tenants],
+            "jobs": {
+                name: {
+                    "computedAt": result.computed_at.isoformat() if result else None,
+                    "refreshDurationMs": round(result.duration * 1000, 1) if result else None,
+                    "error": self.errors.get((name, tenant)),
+                }
+                for name in self.jobs
+                for result in [self.results.get((name, tenant))]
+            },
+        }
+
+
+scheduler = Scheduler(shared=shared_cache.backend)
@@ -0,0 +1,95 @@
+# pushdown.py - Agregações calculadas no banco via RPC (sql/analytics_functions.sql)
+#
+# Habilitado por endpoint com PUSHDOWN_ENDPOINTS (lista separada por vírgula:
+# business-stats, quick-stats, insights). Cada função aqui devolve o payload
+# pronto ou None; com None o handler segue pelo cálculo local do snapshot.
+# Se a função SQL não existir no banco, o endpoint volta para o caminho local
+# e a RPC só é tentada de novo depois de PUSHDOWN_RETRY_SECONDS.
+# O tenant vai como `p_tenant` (NULL = todos os salões).
+import os
+import time
+from datetime import datetime
+
+import analytics
+import log
+import repository
+from snapshots import cutoff
+
+PUSHDOWN_ENDPOINTS = {e.strip() for e in os.getenv("PUSHDOWN_ENDPOINTS", "").split(",") if e.strip()}
+PUSHDOWN_RETRY_SECONDS = float(os.getenv("PUSHDOWN_RETRY_SECONDS", "300"))
+
+# Códigos do PostgREST/Postgres para "função não encontrada"
+_MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+_missing = {}
+stats = {"calls": 0, "fallbacks": 0}
+
+
+def enabled(endpoint):
+    return endpoint in PUSHDOWN_ENDPOINTS
+
+
+async def _call(fn, params):
+    missing_since = _missing.get(fn)
+    if missing_since is not None and time.monotonic() - missing_since < PUSHDOWN_RETRY_SECONDS:
+        stats["fallbacks"] += 1
+        return None
+
+    try:
+        result = await repository.rpc(fn, params)
+        _missing.pop(fn, None)
+        stats["calls"] += 1
+    except Exception as e:
+        if getattr(e, "code", None) in _MISSING_FUNCTION_CODES:
+            log.warning("função SQL não existe no banco, usando cálculo local", function=fn)
+            _missing[fn] = time.monotonic()
+        else:
+            log.error("erro na RPC", function=fn, error=str(e))
+        stats["fallbacks"] += 1
+        return None
+
+    # PostgREST devolve o JSON direto; alguns clientes embrulham em lista
+    if isinstance(result, list):
+        result = result[0] if result else None
+    return result
+
+
+async def business_stats(tenant=None):
+    result = await _call("analytics_business_stats", {
+        "since": cutoff(30),
+        "today": datetime.now().strftime('%Y-%m-%d'),
+        "p_tenant": tenant,
+    })
+    if result is None:
+        return None
+    return {
+        "todayAppointments": int(result["todayAppointments"]),
+        "monthlyRevenue": float(result["monthlyRevenue"]),
+        "activeClients": int(result["activeClients"]),
+        "satisfactionRate": 92.5
+    }
+
+
+async def quick_stats(tenant=None):
+    result = await _call("analytics_quick_stats", {"since": cutoff(30), "p_tenant": tenant})
+    if result is None:
+        return None
+    return analytics.quick_stats_payload(
+        result["total"], result["confirmed"], result["canceled"], result["distinctCustomers"],
+        result["averageTicket"], result["peakHour"], result["popularService"],
+    )
+
+
+async def insights(tenant=None):
+    result = await _call("analytics_insights", {"since": cutoff(90), "p_tenant": tenant})
+    if result is None:
+        return None
+    return analytics.insights_payload(float(result["revenue"]), result["appointments"], result["clients"])
+
+
+def info():
+    return {
+        **stats,
+        "endpoints": sorted(PUSHDOWN_ENDPOINTS),
+        "missing_functions": sorted(_missing),
+    }
@@ -0,0 +1,177 @@
+# resilience.py - Prazo, retry, hedge e circuit breaker nas chamadas ao Supabase
+#
+# Toda query de repository.execute passa por `call`:
+#
+# - cada tentativa tem prazo de SUPABASE_TIMEOUT segundos;
+# - falhas transitórias (prazo estourado, erro de rede) são repetidas até
+#   SUPABASE_RETRIES vezes com backoff exponencial e jitter total;
+# - leituras idempotentes podem ser "hedged": se a tentativa não respondeu em
+#   SUPABASE_HEDGE_AFTER segundos, uma segunda é disparada e vale a primeira
+#   que terminar (desligado com 0);
+# - depois de BREAKER_FAILURES falhas seguidas o circuito abre e as chamadas
+#   falham na hora (CircuitOpenError) por BREAKER_RESET_SECONDS; então uma
+#   chamada de teste decide se fecha de novo.
+#
+# Quem chama (SnapshotCache, precompute) responde com o último resultado bom
+# enquanto o Supabase não volta.
+import asyncio
+import os
+import random
+import time
+from functools import lru_cache
+
+import log
+from metrics import breaker_rejections, supabase_hedges, supabase_retries
+
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", "2"))
+SUPABASE_RETRY_BASE_DELAY = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", "0.2"))
+SUPABASE_HEDGE_AFTER = float(os.getenv("SUPABASE_HEDGE_AFTER", "0"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+
+@lru_cache(maxsize=None)
+def transient_errors():
+    """Falhas em que vale tentar de novo (e que contam para o circuit breaker)
+
+    Erros do PostgREST (APIError: função inexistente, coluna inválida...) não.
+    O httpx só é importado aqui: quando há falha, o cliente do Supabase já o
+    carregou.
+    """
+    import httpx
+    return (asyncio.TimeoutError, OSError, httpx.TransportError)
+
+
+class CircuitOpenError(Exception):
+    """O Supabase está falhando; a chamada nem foi feita"""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            # Uma única chamada de teste por vez
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            log.info("circuit breaker fechado", after_seconds=round(self._clock() - self.opened_at, 1))
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def release(self):
+        """Chamada cancelada: libera a vaga da chamada de teste sem decidir nada"""
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failures:
+            if self.state != self.OPEN:
+                log.warning("circuit breaker aberto", failures=self.consecutive_failures)
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+            self._probing = False
+
+    def info(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened_seconds_ago": round(self._clock() - self.opened_at, 1) if self.opened_at else None,
+        }
+
+
+breaker = CircuitBreaker()
+
+
+async def _attempt(start, timeout):
+    return await asyncio.wait_for(start(), timeout)
+
+
+async def _hedged(start, timeout, hedge_after, label):
+    """Dispara uma segunda tentativa se a primeira passar de `hedge_after`"""
+    first = asyncio.ensure_future(_attempt(start, timeout))
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(_attempt(start, timeout))
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    supabase_hedges.inc(table=label, winner="hedge" if task is second else "primary")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call(start, idempotent=True, label="unknown", timeout=None):
+    """Executa `start()` (coroutine de uma tentativa) com prazo, retry e circuit breaker
+
+    `start` é chamada de novo a cada tentativa; só leituras idempotentes são
+    repetidas ou hedged.
+    """
+    timeout = timeout or SUPABASE_TIMEOUT
+    attempts = 1 + (SUPABASE_RETRIES if idempotent else 0)
+    for attempt in range(attempts):
+        if not breaker.allow():
+            breaker_rejections.inc(table=label)
+            raise CircuitOpenError(f"circuit breaker aberto para o Supabase ({label})")
+        try:
+            if idempotent and SUPABASE_HEDGE_AFTER > 0:
+                result = await _hedged(start, timeout, SUPABASE_HEDGE_AFTER, label)
+            else:
+                result = await _attempt(start, timeout)
+        except transient_errors() as e:
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, SUPABASE_RETRY_BASE_DELAY * 2 ** attempt)
+            log.warning("falha transitória no Supabase, tentando de novo", table=label,
+                        attempt=attempt + 1, delay=round(delay, 3), error=repr(e))
+            supabase_retries.inc(table=label)
+            await asyncio.sleep(delay)
+        except Exception:
+            # O PostgREST respondeu (erro de cliente): o upstream está de pé
+            breaker.record_success()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+def info():
+    return {
+        "breaker": breaker.info(),
+        "timeout": SUPABASE_TIMEOUT,
+        "retries": SUPABASE_RETRIES,
+        "hedge_after": SUPABASE_HEDGE_AFTER or None,
+    }
@@ -0,0 +1,216 @@
+# rollup.py - Rollup diário de agendamentos por (data, serviço, status)
+#
+# Cada célula guarda contagem, soma da receita, quantos têm valor > 0, os
+# clientes distintos e os agendamentos por hora de início (ambos com
+# multiplicidade, para permitir remoção). O rollup é mantido incrementalmente
+# pelo AppointmentStore (sync.py e o change feed, changefeed.py): cada upsert
+# subtrai a versão antiga da linha e soma a nova. Os endpoints leem O(dias)
+# células em vez de O(agendamentos) linhas.
+#
+# Clientes distintos numa janela grande exigiriam unir os e-mails de todas as
+# células. Com muitas linhas (ROLLUP_DISTINCT=auto, a partir de
+# ROLLUP_HLL_MIN_ROWS) ou ROLLUP_DISTINCT=hll, cada (dia, status) guarda um
+# HyperLogLog (sketches.py) no lugar dos Counters de e-mails e a contagem
+# junta os sketches dos dias (memória fixa por dia, erro ~2%). HyperLogLog não
+# aceita remoção: quando uma linha sai de um (dia, status), o sketch é
+# refeito na próxima leitura a partir das linhas daquele dia na cópia local
+# (`rows_on`). ROLLUP_DISTINCT=exact mantém a contagem exata.
+#
+# Serviços e horas continuam exatos: o rollup já é indexado por serviço e há
+# no máximo 24 horas por célula, então a memória não cresce com a janela.
+import os
+from collections import Counter
+from datetime import date
+
+import normalize
+from sketches import HyperLogLog
+
+ROLLUP_DISTINCT = os.getenv("ROLLUP_DISTINCT", "auto")
+ROLLUP_HLL_MIN_ROWS = int(os.getenv("ROLLUP_HLL_MIN_ROWS", "200000"))
+
+
+class RollupCell:
+    __slots__ = ('count', 'revenue', 'paid', 'customers', 'hours')
+
+    def __init__(self, exact=True):
+        self.count = 0
+        self.revenue = 0.0
+        self.paid = 0
+        self.customers = Counter() if exact else None
+        self.hours = Counter()
+
+
+class DailyRollup:
+    def __init__(self, distinct=ROLLUP_DISTINCT, rows_on=None):
+        """`rows_on(data)`: linhas da cópia local com aquela data (refaz os sketches)"""
+        self.distinct = distinct
+        self._rows_on = rows_on
+        self.approximate = False
+        self._days = {}
+        # dia -> {status: HyperLogLog}, (dia, status) a refazer e as datas
+        # como vieram nas linhas (chaves de `rows_on`) de cada dia normalizado
+        self._sketches = {}
+        self._stale = set()
+        self._raw_days = {}
+        # Incrementado quando muda algum dia anterior a hoje; quem depende só
+        # de dias completos (ex.: forecasting.py) usa como chave de cache
+        self.history_version = 0
+
+    def __len__(self):
+        return len(self._days)
+
+    def reset(self, rows):
+        rows = list(rows)
+        self.approximate = self._rows_on is not None and (
+            self.distinct == 'hll' or (self.distinct == 'auto' and len(rows) >= ROLLUP_HLL_MIN_ROWS))
+        self._days = {}
+        self._sketches = {}
+        self._stale = set()
+        self._raw_days = {}
+        self.history_version += 1
+        for row in rows:
+            self._add(row, 1)
+
+    def apply(self, old, new):
+        today = date.today().isoformat()
+        if old is not None:
+            self._add(old, -1, today)
+        if new is not None:
+            self._add(new, 1, today)
+
+    def _add(self, row, sign, today=None):
+        parsed = normalize.day(row.get('date'))
+        if parsed is None:
+            return
+        day = parsed.iso
+        if today and day < today:
+            self.history_version += 1
+        cells = self._days.setdefault(day, {})
+        key = (row.get('service'), row.get('status'))
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = RollupCell(exact=not self.approximate)
+
+        amount = row.get('total_amount') or 0
+        cell.count += sign
+        cell.revenue += sign * amount
+        if amount:
+            cell.paid += sign
+        email = row.get('customer_email')
+        if email and self.approximate:
+            self._raw_days.setdefault(day, set()).add(row.get('date'))
+            status = row.get('status')
+            if sign < 0:
+                self._stale.add((day, status))
+            elif (day, status) not in self._stale:
+                sketches = self._sketches.setdefault(day, {})
+                sketch = sketches.get(status)
+                if sketch is None:
+                    sketch = sketches[status] = HyperLogLog()
+                sketch.add(email)
+        elif email:
+            cell.customers[email] += sign
+            if cell.customers[email] <= 0:
+                del cell.customers[email]
+        hour = normalize.hour(row.get('start_time'))
+        if hour >= 0:
+            cell.hours[hour] += sign
+            if cell.hours[hour] <= 0:
+                del cell.hours[hour]
+
+        if cell.count <= 0:
+            del cells[key]
+            if not cells:
+                del self._days[day]
+
+    def weekday(self, day):
+        """Dia da semana (0=segunda) de 'YYYY-MM-DD', ou None se a data é inválida"""
+        parsed = normalize.day(day)
+        return parsed.weekday if parsed is not None else None
+
+    def cells(self, since=None, status=None):
+        """Itera (data, serviço, status, célula) em ordem de data"""
+        for day in sorted(self._days):
+            if since and day < since:
+                continue
+            for (service, cell_status), cell in self._days[day].items():
+                if status is None or cell_status == status:
+                    yield day, service, cell_status, cell
+
+    def daily_totals(self, since=None, status=None):
+        """Série diária {data: (agendamentos, receita)}"""
+        totals = {}
+        for day, _, _, cell in self.cells(since, status):
+            count, revenue = totals.get(day, (0, 0.0))
+            totals[day] = (count + cell.count, revenue + cell.revenue)
+        return totals
+
+    def by_weekday(self, since=None, status=None):
+        """{dia da semana: (agendamentos, receita)} na ordem em que aparecem"""
+        totals = {}
+        for day, (count, revenue) in self.daily_totals(since, status).items():
+            weekday = self.weekday(day)
+            if weekday is None:
+                continue
+            previous_count, previous_revenue = totals.get(weekday, (0, 0.0))
+            totals[weekday] = (previous_count + count, previous_revenue + revenue)
+        return totals
+
+    def distinct_customers(self, since=None, status=None):
+        """Clientes distintos desde `since` (estimativa HyperLogLog no modo aproximado)"""
+        if not self.approximate:
+            customers = set()
+            for _, _, _, cell in self.cells(since, status):
+                customers.update(cell.customers)
+            return len(customers)
+
+        for day, cell_status in [key for key in self._stale if not since or key[0] >= since]:
+            self._rebuild(day, cell_status)
+        sketches = [
+            sketch
+            for day, by_status in self._sketches.items() if not since or day >= since
+            for cell_status, sketch in by_status.items() if status is None or cell_status == status
+        ]
+        return HyperLogLog.union(sketches).count() if sketches else 0
+
+    def _rebuild(self, day, status):
+        sketch = HyperLogLog()
+        for raw in self._raw_days.get(day, ()):
+            for row in self._rows_on(raw):
+                if row.get('status') == status and row.get('customer_email'):
+                    sketch.add(row['customer_email'])
+        self._stale.discard((day, status))
+        by_status = self._sketches.setdefault(day, {})
+        if sketch:
+            by_status[status] = sketch
+        else:
+            by_status.pop(status, None)
+            if not by_status:
+                del self._sketches[day]
+
+    def window_totals(self, since=None):
+        """Totais de todas as células desde `since` (base do quick-stats)
+
+        {'appointments', 'statuses': Counter, 'services': Counter, 'revenue',
+        'paid', 'hours': Counter}; clientes distintos vêm de `distinct_customers`.
+        """
+        totals = {'appointments': 0, 'statuses': Counter(), 'services': Counter(),
+                  'revenue': 0.0, 'paid': 0, 'hours': Counter()}
+        for _, service, status, cell in self.cells(since):
+            totals['appointments'] += cell.count
+            if status:
+                totals['statuses'][status] += cell.count
+            if service:
+                totals['services'][service] += cell.count
+            totals['revenue'] += cell.revenue
+            totals['paid'] += cell.paid
+            totals['hours'].update(cell.hours)
+        return totals
+
+    def info(self):
+        return {
+            "days": len(self._days),
+            "distinct": "hll" if self.approximate else "exact",
+            "sketches": sum(len(by_status) for by_status in self._sketches.values()),
+            "stale_sketches": len(self._stale),
+        }
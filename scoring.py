@@ -0,0 +1,318 @@
+# scoring.py - Churn e valor do cliente (CLV) por cliente
+#
+# Features de recência, frequência e valor (RFM) de cada cliente a partir dos
+# agendamentos confirmados da cópia local (sync.py):
+#
+# - visitas e gasto até hoje, primeira e última visita e agendamentos futuros
+#   já confirmados;
+# - taxa de retorno por dia com encolhimento Gamma-Poisson: a taxa da base
+#   (retornos / dias de relacionamento, somando todos os clientes) vale como
+#   SCORING_PRIOR_DAYS dias de observação, então quem tem uma visita só herda
+#   a taxa da base e os clientes antigos ficam com a própria;
+# - churn: probabilidade de um cliente ativo, com essa taxa, já ter voltado
+#   depois de `recência` dias (1 - e^(-taxa * recência)): quanto mais
+#   improvável o sumiço, maior. Quem tem agendamento futuro tem churn 0;
+# - CLV: receita esperada em SCORING_HORIZON_DAYS dias, (agendamentos futuros
+#   + taxa * horizonte * (1 - churn)) * ticket médio, com o ticket encolhido
+#   para o da base com peso de uma visita.
+#
+# CustomerScores é listener do AppointmentStore, como o rollup, mas no event
+# loop só enfileira: upserts e ressincronizações são aplicados pelo próximo
+# `refresh()`, que roda numa thread (snapshots.customer_scores) e marca os
+# clientes afetados. Ele calcula todos numa passada vetorizada (colunas NumPy +
+# bincount) na primeira vez, depois de uma ressincronização e na virada do
+# dia; fora isso recalcula só os clientes marcados. `refresh()` e `page()` não
+# rodam ao mesmo tempo (lock).
+import bisect
+import os
+import threading
+from collections import deque
+from datetime import date
+
+import numpy as np
+
+from metrics import scoring_rescored
+from normalize import EPOCH, NO_DAY, epoch_day, iso_day
+
+SCORING_HORIZON_DAYS = int(os.getenv("SCORING_HORIZON_DAYS", "365"))
+SCORING_PRIOR_DAYS = float(os.getenv("SCORING_PRIOR_DAYS", "90"))
+SCORING_HIGH_RISK = float(os.getenv("SCORING_HIGH_RISK", "0.7"))
+SCORING_MEDIUM_RISK = float(os.getenv("SCORING_MEDIUM_RISK", "0.4"))
+SCORING_MAX_PAGE = int(os.getenv("SCORING_MAX_PAGE", "5000"))
+
+# Taxa de retorno enquanto a base não tem nenhum retorno (uma visita por mês)
+DEFAULT_RATE = 1 / 30
+
+FEATURES = {'visits': np.int64, 'spent': np.float64, 'first': np.int64, 'last': np.int64, 'upcoming': np.int64}
+SCORES = ('rate', 'churn', 'expected', 'clv')
+
+
+def _today():
+    return date.today().toordinal() - EPOCH
+
+
+def _risk(churn):
+    if churn >= SCORING_HIGH_RISK:
+        return "alto"
+    return "médio" if churn >= SCORING_MEDIUM_RISK else "baixo"
+
+
+class CustomerScores:
+    """Features e scores de churn/CLV dos clientes de um tenant"""
+
+    def __init__(self, clock=_today):
+        self._clock = clock
+        # e-mail -> {id: linha confirmada}
+        self._rows = {}
+        self._dirty = set()
+        self._full = True
+        self.day = None
+        self.emails = []
+        self._position = {}
+        # E-mails em ordem alfabética (paginação) e as posições correspondentes
+        self._sorted = []
+        self._order = np.zeros(0, dtype=np.int64)
+        self.columns = {**{name: np.zeros(0, dtype=dtype) for name, dtype in FEATURES.items()},
+                        **{name: np.zeros(0) for name in SCORES}}
+        self.prior = {"rate": DEFAULT_RATE, "ticket": 0.0}
+        self.stats = {"full": 0, "incremental": 0, "rescored": 0}
+        # Mudanças do AppointmentStore ainda não aplicadas: ("reset", linhas)
+        # ou ("apply", old, new)
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def reset(self, rows):
+        # O que ainda estava na fila vale menos que a cópia nova
+        self._queue.clear()
+        self._queue.append(("reset", list(rows)))
+
+    def apply(self, old, new):
+        self._queue.append(("apply", old, new))
+
+    def _drain(self):
+        while self._queue:
+            change = self._queue.popleft()
+            if change[0] == "reset":
+                self._rows = {}
+                for row in change[1]:
+                    self._track(row, 1)
+                self._dirty = set()
+                self._full = True
+                continue
+            for row, sign in ((change[1], -1), (change[2], 1)):
+                email = self._track(row, sign) if row is not None else None
+                if email:
+                    self._dirty.add(email)
+
+    def _track(self, row, sign):
+        email = row.get('customer_email')
+        if not email or row.get('status') != 'confirmed':
+            return None
+        if sign > 0:
+            self._rows.setdefault(email, {})[row['id']] = row
+        else:
+            rows = self._rows.get(email)
+            if rows is not None:
+                rows.pop(row.get('id'), None)
+                if not rows:
+                    del self._rows[email]
+        return email
+
+    def refresh(self):
+        """Aplica a fila e recalcula os scores desatualizados; devolve quantos clientes recalculou"""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        self._drain()
+        today = self._clock()
+        if self._full or today != self.day:
+            rescored = self._score_all(today)
+            mode = "full"
+        elif self._dirty:
+            rescored = self._score_dirty(today)
+            mode = "incremental"
+        else:
+            return 0
+        self.stats[mode] += 1
+        self.stats["rescored"] += rescored
+        scoring_rescored.inc(rescored, mode=mode)
+        return rescored
+
+    def _score_all(self, today):
+        # Colunas (cliente, dia, valor) de todas as linhas confirmadas; cada
+        # data distinta é convertida uma vez
+        emails = list(self._rows)
+        size = len(emails)
+        rows = [row for by_id in self._rows.values() for row in by_id.values()]
+        sizes = np.fromiter(map(len, self._rows.values()), dtype=np.int64, count=size)
+        codes = np.repeat(np.arange(size), sizes)
+        dates = [row.get('date') for row in rows]
+        parsed = {value: epoch_day(value) for value in set(dates)}
+        days = np.fromiter(map(parsed.__getitem__, dates), dtype=np.int64, count=len(rows))
+        amount = np.fromiter((row.get('total_amount') or 0 for row in rows), dtype=np.float64, count=len(rows))
+        past = (days != NO_DAY) & (days <= today)
+        future = days > today
+
+        columns = {
+            'visits': np.bincount(codes[past], minlength=size),
+            'spent': np.bincount(codes[past], weights=amount[past], minlength=size),
+            'upcoming': np.bincount(codes[future], minlength=size),
+            'first': np.full(size, np.iinfo(np.int64).max, dtype=np.int64),
+            'last': np.full(size, NO_DAY, dtype=np.int64),
+        }
+        np.minimum.at(columns['first'], codes[past], days[past])
+        np.maximum.at(columns['last'], codes[past], days[past])
+        columns['first'][columns['visits'] == 0] = NO_DAY
+        for name in SCORES:
+            columns[name] = np.zeros(size)
+
+        self.columns = columns
+        self.emails = emails
+        self._position = {email: i for i, email in enumerate(self.emails)}
+        self._sorted = sorted(self.emails)
+        self._order = np.fromiter(map(self._position.__getitem__, self._sorted), dtype=np.int64, count=size)
+
+        # Taxa de retorno e ticket médio da base (a priori dos clientes)
+        seen = columns['visits'] > 0
+        repeats = int((columns['visits'][seen] - 1).sum())
+        tenure = int((today - columns['first'][seen]).sum())
+        visits = int(columns['visits'].sum())
+        self.prior = {
+            "rate": repeats / tenure if repeats and tenure else DEFAULT_RATE,
+            "ticket": float(columns['spent'].sum()) / visits if visits else 0.0,
+        }
+
+        self._score(slice(None), today)
+        self._full = False
+        self._dirty = set()
+        self.day = today
+        return size
+
+    def _score_dirty(self, today):
+        dirty, self._dirty = list(self._dirty), set()
+        self._add([email for email in dirty if email not in self._position])
+        positions = np.fromiter(map(self._position.__getitem__, dirty), dtype=np.int64, count=len(dirty))
+        columns = self.columns
+        for i, email in zip(positions.tolist(), dirty):
+            visits = upcoming = 0
+            spent = 0.0
+            first = last = NO_DAY
+            for row in self._rows.get(email, {}).values():
+                day = epoch_day(row.get('date'))
+                if day == NO_DAY:
+                    continue
+                if day > today:
+                    upcoming += 1
+                    continue
+                visits += 1
+                spent += row.get('total_amount') or 0
+                first = day if first == NO_DAY else min(first, day)
+                last = max(last, day)
+            columns['visits'][i], columns['spent'][i], columns['upcoming'][i] = visits, spent, upcoming
+            columns['first'][i], columns['last'][i] = first, last
+        self._score(positions, today)
+        return len(dirty)
+
+    def _add(self, emails):
+        """Abre posições para clientes que apareceram depois do último cálculo completo"""
+        if not emails:
+            return
+        for email in emails:
+            self._position[email] = len(self.emails)
+            self.emails.append(email)
+            bisect.insort(self._sorted, email)
+        extra = len(emails)
+        for name, column in self.columns.items():
+            fill = NO_DAY if name in ('first', 'last') else 0
+            self.columns[name] = np.concatenate([column, np.full(extra, fill, dtype=column.dtype)])
+        self._order = np.fromiter(map(self._position.__getitem__, self._sorted), dtype=np.int64,
+                                  count=len(self._sorted))
+
+    def _score(self, index, today):
+        """Taxa de retorno, churn, visitas esperadas e CLV dos clientes em `index`"""
+        columns = self.columns
+        visits = columns['visits'][index]
+        upcoming = columns['upcoming'][index]
+        seen = visits > 0
+        tenure = np.where(seen, today - columns['first'][index], 0)
+        recency = np.where(seen, today - columns['last'][index], 0)
+
+        rate = (self.prior["rate"] * SCORING_PRIOR_DAYS + np.maximum(visits - 1, 0)) / (SCORING_PRIOR_DAYS + tenure)
+        churn = np.where(upcoming > 0, 0.0, 1 - np.exp(-rate * recency))
+        expected = upcoming + rate * SCORING_HORIZON_DAYS * (1 - churn)
+        ticket = (columns['spent'][index] + self.prior["ticket"]) / (visits + 1)
+
+        columns['rate'][index] = rate
+        columns['churn'][index] = churn
+        columns['expected'][index] = expected
+        columns['clv'][index] = expected * ticket
+
+    def page(self, cursor=None, limit=1000, min_churn=None):
+        """Scores em ordem de e-mail, a partir do primeiro e-mail depois de `cursor`
+
+        `nextCursor` da resposta é o `cursor` da página seguinte (None na última).
+        """
+        if not 1 <= limit <= SCORING_MAX_PAGE:
+            raise ValueError(f"limit deve estar entre 1 e {SCORING_MAX_PAGE}")
+        with self._lock:
+            return self._page(cursor, limit, min_churn)
+
+    def _page(self, cursor, limit, min_churn):
+        start = bisect.bisect_right(self._sorted, cursor) if cursor else 0
+        order = self._order[start:]
+        columns = self.columns
+        selected = (columns['visits'][order] + columns['upcoming'][order]) > 0
+        if min_churn is not None:
+            selected &= columns['churn'][order] >= min_churn
+        positions = order[selected]
+        page = positions[:limit]
+
+        values = {name: columns[name][page].tolist() for name in (*FEATURES, *SCORES)}
+        customers = [
+            {
+                "email": self.emails[i],
+                "visits": visits,
+                "totalSpent": round(spent, 2),
+                "lastVisit": iso_day(last) if last != NO_DAY else None,
+                "recencyDays": self.day - last if last != NO_DAY else None,
+                "upcomingAppointments": upcoming,
+                "churnProbability": round(churn, 4),
+                "risk": _risk(churn),
+                "expectedVisits": round(expected, 2),
+                "clv": round(clv, 2),
+            }
+            for i, visits, spent, last, upcoming, churn, expected, clv in zip(
+                page.tolist(), values['visits'], values['spent'], values['last'], values['upcoming'],
+                values['churn'], values['expected'], values['clv'])
+        ]
+        return {
+            "customers": customers,
+            "nextCursor": customers[-1]["email"] if len(positions) > limit else None,
+            "summary": self.summary(),
+            "scoredAt": iso_day(self.day) if self.day is not None else None,
+        }
+
+    def summary(self):
+        """Totais da base: clientes, quantos em risco alto, churn médio e receita esperada"""
+        columns = self.columns
+        active = (columns['visits'] + columns['upcoming']) > 0
+        churn = columns['churn'][active]
+        return {
+            "customers": int(active.sum()),
+            "atRisk": int((churn >= SCORING_HIGH_RISK).sum()),
+            "averageChurn": round(float(churn.mean()), 4) if len(churn) else 0.0,
+            "expectedRevenue": round(float(columns['clv'][active].sum()), 2),
+            "horizonDays": SCORING_HORIZON_DAYS,
+            "baseRate": round(self.prior["rate"], 5),
+            "baseTicket": round(self.prior["ticket"], 2),
+        }
+
+    def info(self):
+        return {
+            **self.stats,
+            "customers": len(self.emails),
+            "dirty": len(self._dirty),
+            "queued": len(self._queue),
+            "day": iso_day(self.day) if self.day is not None else None,
+        }
@@ -0,0 +1,154 @@
+# segmentation.py - Segmentação de clientes com K-means (RFM)
+#
+# Features por cliente: recência (dias desde a última visita), frequência
+# (visitas) e valor (gasto total). Frequência e valor passam por log1p e as
+# três são padronizadas (z-score) antes do clustering.
+#
+# - Inicialização k-means++ com semente fixa (resultado determinístico).
+# - Atualizações mini-batch (Sculley, 2010) com distâncias vetorizadas em
+#   NumPy, então a base inteira é agrupada em milissegundos.
+# - Os centróides (no espaço log, antes da padronização) são salvos em
+#   KMEANS_STATE_PATH (um arquivo por tenant) e reaproveitados como ponto de
+#   partida na próxima execução (warm start).
+# - Os clusters são rotulados ordenando os centróides por um score de valor
+#   (valor + frequência - recência): o maior vira VIP, o menor vira Novo.
+import json
+import os
+import re
+
+import numpy as np
+
+import log
+
+SEGMENT_LABELS = ["VIP", "Frequente", "Ativo", "Novo"]
+
+KMEANS_STATE_PATH = os.getenv("KMEANS_STATE_PATH", ".cache/segmentation_centroids.json")
+KMEANS_BATCH_SIZE = int(os.getenv("KMEANS_BATCH_SIZE", "1024"))
+KMEANS_MAX_ITER = int(os.getenv("KMEANS_MAX_ITER", "100"))
+KMEANS_SEED = 42
+
+
+def rfm_matrix(client_data):
+    """Matriz (n, 3) de recência, log1p(frequência), log1p(valor)"""
+    features = np.array(
+        [(c['last_visit_days'], c['visit_count'], c['total_spent'] or 0) for c in client_data],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    features[:, 1:] = np.log1p(np.maximum(features[:, 1:], 0))
+    return features
+
+
+def squared_distances(points, centroids):
+    """Distâncias euclidianas ao quadrado (n, k) sem laços em Python"""
+    d = (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2 * points @ centroids.T
+        + (centroids ** 2).sum(axis=1)[None, :]
+    )
+    return np.maximum(d, 0)
+
+
+def kmeans_plus_plus(points, k, rng):
+    """Escolhe k centróides iniciais com a heurística k-means++"""
+    centroids = [points[rng.integers(len(points))]]
+    closest = squared_distances(points, centroids[0][None, :])[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total == 0:
+            index = rng.integers(len(points))
+        else:
+            index = rng.choice(len(points), p=closest / total)
+        centroids.append(points[index])
+        closest = np.minimum(closest, squared_distances(points, points[index][None, :])[:, 0])
+    return np.array(centroids)
+
+
+def mini_batch_kmeans(points, k, init=None, batch_size=KMEANS_BATCH_SIZE,
+                      max_iter=KMEANS_MAX_ITER, seed=KMEANS_SEED, tol=1e-4):
+    """K-means mini-batch; devolve (centróides, rótulos de cada ponto)"""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(init, dtype=np.float64) if init is not None else kmeans_plus_plus(points, k, rng)
+    counts = np.zeros(k)
+    batch_size = min(batch_size, len(points))
+
+    for _ in range(max_iter):
+        if batch_size == len(points):
+            batch = points
+        else:
+            batch = points[rng.integers(len(points), size=batch_size)]
+        nearest = squared_distances(batch, centroids).argmin(axis=1)
+
+        previous = centroids.copy()
+        for cluster in range(k):
+            members = batch[nearest == cluster]
+            if not len(members):
+                continue
+            # Taxa de aprendizado por centróide = 1 / (pontos já vistos)
+            counts[cluster] += len(members)
+            eta = len(members) / counts[cluster]
+            centroids[cluster] = (1 - eta) * centroids[cluster] + eta * members.mean(axis=0)
+
+        if np.abs(centroids - previous).max() < tol:
+            break
+
+    return centroids, squared_distances(points, centroids).argmin(axis=1)
+
+
+def state_path(tenant=None):
+    """Arquivo de centróides do tenant (None usa KMEANS_STATE_PATH)"""
+    if tenant is None:
+        return KMEANS_STATE_PATH
+    root, ext = os.path.splitext(KMEANS_STATE_PATH)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_-]', '_', str(tenant))}{ext}"
+
+
+def _load_state(k, path=KMEANS_STATE_PATH):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        centroids = np.array(state["centroids"], dtype=np.float64)
+        if centroids.shape == (k, 3):
+            return centroids
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _save_state(centroids, path=KMEANS_STATE_PATH):
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"centroids": centroids.tolist()}, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("não foi possível salvar os centróides", path=path, error=str(e))
+
+
+def segment(client_data, labels=SEGMENT_LABELS, state_path=KMEANS_STATE_PATH):
+    """Conta clientes por segmento; chaves na ordem de `labels`"""
+    points = rfm_matrix(client_data)
+    k = min(len(labels), len(points))
+    segmentation = {label: 0 for label in labels}
+    if k == 0:
+        return segmentation
+
+    mean = points.mean(axis=0)
+    std = points.std(axis=0)
+    std[std == 0] = 1
+    scaled = (points - mean) / std
+
+    warm = _load_state(k, state_path)
+    init = (warm - mean) / std if warm is not None else None
+    centroids, assigned = mini_batch_kmeans(scaled, k, init=init)
+    _save_state(centroids * std + mean, state_path)
+
+    # Score de valor no espaço padronizado: recência baixa é melhor
+    score = centroids[:, 2] + centroids[:, 1] - centroids[:, 0]
+    order = sorted(range(k), key=lambda c: (-score[c], c))
+    sizes = np.bincount(assigned, minlength=k)
+    for rank, cluster in enumerate(order):
+        segmentation[labels[rank]] = int(sizes[cluster])
+    return segmentation
@@ -0,0 +1,264 @@
+# shared_cache.py - Cache chave/valor compartilhado entre os workers
+#
+# Com vários workers (gunicorn.conf.py) cada processo tem a própria memória:
+# sem um cache comum, cada um recalcularia todos os payloads. O precompute.py
+# guarda aqui os resultados, a geração (ETag) e quem é o líder que recalcula;
+# o changefeed.py repassa por aqui os eventos do webhook para todos os workers.
+#
+# CACHE_BACKEND escolhe o backend:
+#
+# - memory: dict do processo (padrão; um worker só, comportamento de antes);
+# - sqlite: arquivo local em CACHE_SQLITE_PATH (WAL), para workers na mesma
+#   máquina;
+# - redis: qualquer servidor que fale o protocolo do Redis em CACHE_REDIS_URL
+#   (Redis, Valkey, KeyDB ou o substituto local benchmarks/fake_redis.py).
+#
+# Todos expõem get/set/incr/acquire com valores em bytes. As operações são
+# síncronas e curtas (arquivo local ou rede local); erros do backend sobem
+# como SharedCacheError para quem chama cair no cálculo local.
+import os
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "/tmp/margareth-cache.sqlite3")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", "1"))
+# Prefixo das chaves (vários ambientes no mesmo Redis)
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "margareth:")
+
+
+class SharedCacheError(Exception):
+    """O backend do cache compartilhado falhou (arquivo, rede ou protocolo)"""
+
+
+class MemoryBackend:
+    """Cache do próprio processo: compartilhado só entre as tasks de um worker"""
+
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.get(key) or 0) + 1
+            self.set(key, str(value).encode())
+        return value
+
+    def acquire(self, name, owner, ttl):
+        with self._lock:
+            current = self.get(name)
+            if current is not None and current != owner.encode():
+                return False
+            self.set(name, owner.encode(), ttl)
+            return True
+
+    def info(self):
+        return {"backend": "memory", "keys": len(self._data)}
+
+
+class SqliteBackend:
+    """Tabela chave/valor num arquivo SQLite (WAL) visível para todos os workers da máquina"""
+
+    shared = True
+
+    def __init__(self, path=CACHE_SQLITE_PATH, timeout=CACHE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # Uma conexão por processo e thread: conexões não sobrevivem ao fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            try:
+                conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                       check_same_thread=False)
+                conn.execute("pragma journal_mode=wal")
+                conn.execute("pragma synchronous=normal")
+                conn.execute("create table if not exists kv (key text primary key, value blob, expires real)")
+            except sqlite3.Error as e:
+                raise SharedCacheError(f"sqlite {self.path}: {e}") from e
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _execute(self, sql, params=()):
+        try:
+            return self._connection().execute(sql, params)
+        except sqlite3.Error as e:
+            raise SharedCacheError(f"sqlite {self.path}: {e}") from e
+
+    def get(self, key):
+        row = self._execute("select value from kv where key = ? and (expires is null or expires > ?)",
+                            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        self._execute("insert or replace into kv (key, value, expires) values (?, ?, ?)",
+                      (key, value, time.time() + ttl if ttl else None))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._execute("delete from kv where expires <= ?", (time.time(),))
+
+    def incr(self, key):
+        # Guarda bytes, como `set` e os outros backends: `get` devolve b'2', não '2'
+        row = self._execute(
+            "insert into kv (key, value) values (?, cast('1' as blob)) "
+            "on conflict (key) do update "
+            "set value = cast(cast(cast(cast(value as text) as integer) + 1 as text) as blob) "
+            "returning value", (key,)).fetchone()
+        return int(row[0])
+
+    def acquire(self, name, owner, ttl):
+        now = time.time()
+        cursor = self._execute(
+            "insert into kv (key, value, expires) values (?, ?, ?) "
+            "on conflict (key) do update set value = excluded.value, expires = excluded.expires "
+            "where kv.value = excluded.value or kv.expires <= ?",
+            (name, owner.encode(), now + ttl, now))
+        return cursor.rowcount == 1
+
+    def info(self):
+        count = self._execute("select count(*) from kv").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "keys": count}
+
+
+class RedisBackend:
+    """Cliente mínimo do protocolo do Redis (RESP) para GET/SET/INCR; sem dependências"""
+
+    shared = True
+
+    def __init__(self, url=CACHE_REDIS_URL, timeout=CACHE_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+        self._pid = None
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._file, self._pid = sock, sock.makefile("rb"), os.getpid()
+        if self.password:
+            self._roundtrip("AUTH", self.password)
+        if self.db:
+            self._roundtrip("SELECT", self.db)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    def command(self, *args):
+        with self._lock:
+            try:
+                if self._sock is None or self._pid != os.getpid():
+                    self._connect()
+                return self._roundtrip(*args)
+            except (OSError, EOFError) as e:
+                # Conexão num estado desconhecido: a próxima chamada reconecta
+                self._close()
+                raise SharedCacheError(f"redis {self.host}:{self.port}: {e}") from e
+
+    def _roundtrip(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+        return self._reply()
+
+    def _reply(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise EOFError("conexão fechada pelo servidor")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise SharedCacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._file.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._reply() for _ in range(size)]
+        raise SharedCacheError(f"resposta inválida do redis: {line!r}")
+
+    def get(self, key):
+        return self.command("GET", CACHE_KEY_PREFIX + key)
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.command("SET", CACHE_KEY_PREFIX + key, value, "PX", int(ttl * 1000))
+        else:
+            self.command("SET", CACHE_KEY_PREFIX + key, value)
+
+    def incr(self, key):
+        return self.command("INCR", CACHE_KEY_PREFIX + key)
+
+    def acquire(self, name, owner, ttl):
+        key = CACHE_KEY_PREFIX + name
+        if self.command("SET", key, owner, "NX", "PX", int(ttl * 1000)) == "OK":
+            return True
+        if self.command("GET", key) == owner.encode():
+            # Renova o próprio lease (entre o GET e o PEXPIRE ele pode ter
+            # expirado; no pior caso dois líderes por um ciclo)
+            self.command("PEXPIRE", key, int(ttl * 1000))
+            return True
+        return False
+
+    def info(self):
+        return {"backend": "redis", "host": self.host, "port": self.port, "db": self.db}
+
+
+def create(kind=CACHE_BACKEND):
+    if kind == "sqlite":
+        return SqliteBackend()
+    if kind == "redis":
+        return RedisBackend()
+    if kind != "memory":
+        raise ValueError(f"CACHE_BACKEND desconhecido: {kind}")
+    return MemoryBackend()
+
+
+backend = create()
+
+
+def info():
+    try:
+        return backend.info()
+    except SharedCacheError as e:
+        return {"backend": CACHE_BACKEND, "error": str(e)}
@@ -0,0 +1,208 @@
+# snapshots.py - Snapshot compartilhado de agendamentos e usuários
+#
+# Um carregamento do dashboard chama ~6 endpoints que antes baixavam janelas
+# sobrepostas de `appointments` (30, 60, 90 e 180 dias). Agora todos leem da
+# cópia local mantida por sync.py, que só baixa as mudanças desde a última
+# sincronização: os indicadores por janela saem do rollup diário (atualizado
+# no lugar), assim como o índice por cliente da segmentação (customers.py) e os
+# scores de churn/CLV (scoring.py); esses dois só são criados no primeiro uso.
+#
+# Tudo é particionado por tenant (salão): cada um tem a própria cópia local,
+# rollup e entradas de cache, e as queries levam o filtro do tenant para o
+# Supabase. `tenant=None` (sem ?tenant=) é a visão global, sem filtro, como
+# antes da separação por salão; ela só é recusada com TENANT_GLOBAL_VIEW=0 ou
+# com TENANT_IDS definido (a menos que TENANT_GLOBAL_VIEW=1).
+#
+# Só tenants conhecidos ganham cópia local (`check_tenant`): os de TENANT_IDS
+# ou, sem essa lista, os que têm agendamento ou usuário no Supabase (uma
+# consulta de uma linha, lembrada por TENANT_CHECK_TTL; sem a coluna do
+# tenant no banco nenhum existe). Um tenant sem uso por
+# TENANT_IDLE_SECONDS é descartado com as entradas de cache dele.
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import repository
+from cache import SnapshotCache
+from demographics import USER_COLUMNS, UserTable
+from rollup import DailyRollup
+from sync import AppointmentStore
+
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "60"))
+SNAPSHOT_MAX_STALE = float(os.getenv("SNAPSHOT_MAX_STALE", "300"))
+TENANT_IDS = {tenant.strip() for tenant in os.getenv("TENANT_IDS", "").split(",") if tenant.strip()}
+# Com a lista de salões a visão global deixa de ser o padrão
+TENANT_GLOBAL_VIEW = os.getenv("TENANT_GLOBAL_VIEW", "0" if TENANT_IDS else "1") == "1"
+TENANT_CHECK_TTL = float(os.getenv("TENANT_CHECK_TTL", "600"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", os.getenv("PRECOMPUTE_TENANT_IDLE", "3600")))
+# Verificações lembradas (tenants existentes e inexistentes), no máximo
+TENANT_CHECK_CACHE_SIZE = 1024
+
+_TENANT_FORMAT = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+
+cache = SnapshotCache(ttl=SNAPSHOT_TTL, max_stale=SNAPSHOT_MAX_STALE)
+
+
+class TenantData:
+    """Cópia local e rollup de um tenant, mantido a cada sincronização"""
+
+    def __init__(self, tenant=None):
+        self.tenant = tenant
+        self.store = AppointmentStore(tenant=tenant)
+        self.rollup = DailyRollup(rows_on=self.store.partition)
+        self.store.add_listener(self.rollup)
+        # Índice por cliente e scores de churn/CLV, criados no primeiro uso da rota
+        self.customers = None
+        self.scores = None
+        self.last_used = time.monotonic()
+
+
+class UnknownTenant(ValueError):
+    """Tenant inexistente ou não permitido (o handler responde 404/400)"""
+
+
+_tenants = {}
+# tenant -> (existe, instante da verificação)
+_checked = OrderedDict()
+_last_sweep = time.monotonic()
+
+
+async def check_tenant(tenant):
+    """Levanta UnknownTenant se o tenant não pode ser servido"""
+    if tenant is None:
+        if not TENANT_GLOBAL_VIEW:
+            raise UnknownTenant("Informe ?tenant= (visão global desligada)")
+        return
+    if not _TENANT_FORMAT.fullmatch(tenant):
+        raise UnknownTenant(f"Tenant inválido: {tenant[:64]}")
+    if TENANT_IDS:
+        if tenant not in TENANT_IDS:
+            raise UnknownTenant(f"Tenant desconhecido: {tenant}")
+        return
+    if tenant in _tenants:
+        return
+    now = time.monotonic()
+    checked = _checked.get(tenant)
+    if checked is None or now - checked[1] > TENANT_CHECK_TTL:
+        checked = _checked[tenant] = (await repository.tenant_exists(tenant), now)
+        _checked.move_to_end(tenant)
+        while len(_checked) > TENANT_CHECK_CACHE_SIZE:
+            _checked.popitem(last=False)
+    if not checked[0]:
+        raise UnknownTenant(f"Tenant desconhecido: {tenant}")
+
+
+def tenant_data(tenant=None):
+    now = time.monotonic()
+    evict_idle(now)
+    data = _tenants.get(tenant)
+    if data is None:
+        data = _tenants[tenant] = TenantData(tenant)
+    data.last_used = now
+    return data
+
+
+def evict_idle(now=None):
+    """Descarta os tenants sem uso há TENANT_IDLE_SECONDS e as entradas de cache deles"""
+    global _last_sweep
+    now = now if now is not None else time.monotonic()
+    if now - _last_sweep < min(60.0, TENANT_IDLE_SECONDS):
+        return
+    _last_sweep = now
+    for tenant, data in list(_tenants.items()):
+        if now - data.last_used > TENANT_IDLE_SECONDS:
+            del _tenants[tenant]
+            cache.drop(lambda key: key[1] == tenant)
+
+
+def tenants():
+    return list(_tenants)
+
+
+def loaded(tenant=None):
+    """TenantData do tenant se ele já foi carregado (sem criar)"""
+    return _tenants.get(tenant)
+
+
+def watermark(tenant=None):
+    """Watermark sincronizado do tenant (compõe o ETag); None se não foi carregado"""
+    data = _tenants.get(tenant)
+    return data.store.watermark if data is not None else None
+
+
+def cutoff(days, now=None):
+    """Data (YYYY-MM-DD) de `days` dias atrás"""
+    return ((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+async def customer_index(tenant=None):
+    """Agregados por cliente dos agendamentos confirmados, recalculados só para quem mudou
+
+    Como em `customer_scores`, o listener só enfileira e a fila é aplicada
+    numa thread.
+    """
+    from customers import CustomerIndex
+    data = tenant_data(tenant)
+
+    async def load():
+        await data.store.sync()
+        if data.customers is None:
+            data.customers = CustomerIndex()
+            data.store.add_listener(data.customers)
+        return data.customers
+
+    index = await cache.get(("customers", tenant), load)
+    await asyncio.to_thread(index.refresh)
+    return index
+
+
+async def daily_rollup(tenant=None):
+    """Rollup diário (data, serviço, status) atualizado até a última sincronização"""
+    data = tenant_data(tenant)
+
+    async def load():
+        await data.store.sync()
+        return data.rollup
+
+    return await cache.get(("rollup", tenant), load)
+
+
+async def customer_scores(tenant=None):
+    """Scores de churn/CLV por cliente, recalculados só para quem mudou desde a última leitura
+
+    O cálculo (a passada completa leva centenas de ms num tenant grande) roda
+    numa thread; o listener só enfileira as mudanças (ver scoring.py).
+    """
+    from scoring import CustomerScores
+    data = tenant_data(tenant)
+
+    async def load():
+        await data.store.sync()
+        if data.scores is None:
+            data.scores = CustomerScores()
+            data.store.add_listener(data.scores)
+        return data.scores
+
+    scores = await cache.get(("scores", tenant), load)
+    await asyncio.to_thread(scores.refresh)
+    return scores
+
+
+async def completed_users(tenant=None):
+    """Usuários com perfil completo (só as colunas usadas, ver demographics.USER_COLUMNS)"""
+    async def load():
+        return UserTable(await repository.fetch_users(USER_COLUMNS, profile_completed=True, tenant=tenant))
+
+    return await cache.get(("users", tenant, "profile_completed"), load)
+
+
+def info():
+    return {
+        str(tenant): {**data.store.info(), "rollup": data.rollup.info(),
+                      "customers": data.customers.info() if data.customers is not None else None,
+                      "scores": data.scores.info() if data.scores is not None else None}
+        for tenant, data in _tenants.items()
+    }
@@ -0,0 +1,118 @@
+-- analytics_functions.sql - Agregações executadas no Postgres (pushdown)
+--
+-- Instale no SQL editor do Supabase e habilite por endpoint com
+-- PUSHDOWN_ENDPOINTS=business-stats,quick-stats,insights. Cada função devolve
+-- poucos escalares em JSON em vez de milhares de linhas. Sem as funções a API
+-- continua usando o cálculo local (ver pushdown.py).
+--
+-- `date::date` funciona tanto se a coluna for `date` quanto `text` YYYY-MM-DD.
+--
+-- `p_tenant` restringe ao salão (coluna `salon_id`, ver TENANT_COLUMN em
+-- repository.py); NULL agrega todos. Os índices abaixo cobrem os filtros por
+-- salão + data usados pela API e pela sincronização incremental. Para que
+-- sejam usados o filtro fica em analytics_appointments/analytics_clients:
+-- o parâmetro é convertido para o tipo da coluna (`%type`), e não a coluna
+-- para text, e salão e visão global são ramos separados, cada um com o
+-- próprio plano (em vez de `p_tenant is null or ...`).
+
+create index if not exists appointments_salon_date_idx on appointments (salon_id, date);
+create index if not exists appointments_salon_updated_idx on appointments (salon_id, updated_at);
+create index if not exists users_salon_idx on users (salon_id);
+
+-- Versões sem tenant (substituídas pelas de baixo)
+drop function if exists analytics_business_stats(date, date);
+drop function if exists analytics_quick_stats(date);
+drop function if exists analytics_insights(date);
+
+create or replace function analytics_appointments(since date, p_tenant text default null)
+returns setof appointments
+language plpgsql
+stable
+as $$
+declare
+  v_tenant appointments.salon_id%type := p_tenant;
+begin
+  if p_tenant is null then
+    return query select * from appointments where date::date >= since;
+  else
+    return query select * from appointments where salon_id = v_tenant and date::date >= since;
+  end if;
+end;
+$$;
+
+create or replace function analytics_clients(p_tenant text default null)
+returns bigint
+language plpgsql
+stable
+as $$
+declare
+  v_tenant users.salon_id%type := p_tenant;
+begin
+  if p_tenant is null then
+    return (select count(*) from users where profile_completed);
+  end if;
+  return (select count(*) from users where profile_completed and salon_id = v_tenant);
+end;
+$$;
+
+create or replace function analytics_business_stats(since date, today date, p_tenant text default null)
+returns json
+language sql
+stable
+as $$
+  select json_build_object(
+    'todayAppointments', count(*) filter (where a.date::date = today),
+    'monthlyRevenue', coalesce(sum(a.total_amount), 0),
+    'activeClients', count(distinct a.customer_email)
+  )
+  from analytics_appointments(since, p_tenant) a
+  where a.status = 'confirmed';
+$$;
+
+create or replace function analytics_quick_stats(since date, p_tenant text default null)
+returns json
+language sql
+stable
+as $$
+  with w as (
+    select status, customer_email, total_amount, service, start_time
+    from analytics_appointments(since, p_tenant)
+  )
+  select json_build_object(
+    'total', (select count(*) from w),
+    'confirmed', (select count(*) from w where status = 'confirmed'),
+    'canceled', (select count(*) from w where status = 'canceled'),
+    'distinctCustomers', (select count(distinct customer_email) from w),
+    'averageTicket', (select coalesce(avg(total_amount), 0) from w where total_amount <> 0),
+    'peakHour', (
+      select split_part(start_time::text, ':', 1)::int
+      from w
+      where start_time is not null
+      group by 1
+      order by count(*) desc, 1
+      limit 1
+    ),
+    'popularService', (
+      select service
+      from w
+      where service is not null and service <> ''
+      group by service
+      order by count(*) desc, service
+      limit 1
+    )
+  );
+$$;
+
+create or replace function analytics_insights(since date, p_tenant text default null)
+returns json
+language sql
+stable
+as $$
+  select json_build_object(
+    'appointments', count(*),
+    'revenue', coalesce(sum(a.total_amount), 0),
+    'clients', analytics_clients(p_tenant)
+  )
+  from analytics_appointments(since, p_tenant) a
+  where a.status = 'confirmed';
+$$;
@@ -0,0 +1,24 @@
+-- changefeed.sql - Database Webhook que envia as mudanças de `appointments` à API
+--
+-- Instale no SQL editor do Supabase (ou crie o webhook equivalente em
+-- Database > Webhooks) trocando a URL e o segredo, e suba a API com
+-- CHANGEFEED_ENABLED=1 e CHANGEFEED_SECRET igual ao header abaixo. Cada
+-- INSERT/UPDATE/DELETE vira um POST em /api/ingest/appointments com
+-- {"type", "table", "schema", "record", "old_record"} (ver changefeed.py).
+--
+-- O webhook é assíncrono (pg_net): uma falha de entrega não bloqueia a
+-- escrita. Eventos perdidos são recuperados pela reconciliação periódica
+-- (SYNC_RECONCILE_SECONDS, sync.py), que depende de `updated_at` ser
+-- atualizado em toda mudança (trigger de sql/updated_at.sql).
+
+drop trigger if exists appointments_changefeed on appointments;
+
+create trigger appointments_changefeed
+after insert or update or delete on appointments
+for each row execute function supabase_functions.http_request(
+  'https://SUA-API/api/ingest/appointments',
+  'POST',
+  '{"Content-Type": "application/json", "X-Webhook-Secret": "TROQUE-ESTE-SEGREDO"}',
+  '{}',
+  '5000'
+);
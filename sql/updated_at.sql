@@ -0,0 +1,24 @@
+-- updated_at.sql - Coluna de watermark da sincronização incremental
+--
+-- Instale no SQL editor do Supabase antes de subir a API com o watermark
+-- padrão (SYNC_WATERMARK_COLUMN=updated_at, ver sync.py). A sincronização só
+-- pede linhas com `updated_at` maior que a última vista, então a coluna tem
+-- que existir e mudar em todo UPDATE: o trigger do `moddatetime` grava o
+-- horário da transação a cada alteração, inclusive as feitas fora da API
+-- (painel do Supabase, outros serviços).
+--
+-- Linhas antigas recebem o horário da migração (a próxima sincronização
+-- incremental baixa todas uma vez). Sem a migração, use
+-- SYNC_WATERMARK_COLUMN=date (reabre os últimos SYNC_DATE_LOOKBACK_DAYS dias).
+
+create extension if not exists moddatetime schema extensions;
+
+alter table appointments add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists appointments_updated_at on appointments;
+
+create trigger appointments_updated_at
+before update on appointments
+for each row execute procedure extensions.moddatetime(updated_at);
+
+create index if not exists appointments_salon_updated_idx on appointments (salon_id, updated_at);
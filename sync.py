@@ -0,0 +1,235 @@
+# sync.py - Sincronização incremental de agendamentos
+#
+# Mantém uma cópia local de `appointments` particionada por data. A primeira
+# sincronização baixa a tabela inteira; as seguintes só pedem linhas com a
+# coluna de watermark (por padrão `updated_at`) maior que a última vista e
+# fazem merge por `id`, então mudanças de status substituem a linha antiga.
+# `updated_at` e o trigger que a atualiza em todo UPDATE vêm de
+# sql/updated_at.sql; sem essa migração use SYNC_WATERMARK_COLUMN=date.
+# Assim o custo de transferência por requisição não cresce com o histórico.
+#
+# Com o change feed ligado (CHANGEFEED_ENABLED=1, ver changefeed.py) as
+# mudanças chegam por webhook via `ingest` e a consulta de delta só roda a
+# cada SYNC_RECONCILE_SECONDS, para recuperar eventos perdidos.
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import repository
+
+SYNC_WATERMARK_COLUMN = os.getenv("SYNC_WATERMARK_COLUMN", "updated_at")
+# Com watermark em `date` não há como saber o que mudou: reabre os últimos dias
+SYNC_DATE_LOOKBACK_DAYS = int(os.getenv("SYNC_DATE_LOOKBACK_DAYS", "7"))
+# Ressincronização completa periódica (reconcilia linhas apagadas no banco)
+SYNC_FULL_REFRESH_SECONDS = float(os.getenv("SYNC_FULL_REFRESH_SECONDS", str(6 * 3600)))
+CHANGEFEED_ENABLED = os.getenv("CHANGEFEED_ENABLED", "0") == "1"
+SYNC_RECONCILE_SECONDS = float(os.getenv("SYNC_RECONCILE_SECONDS", "300"))
+
+APPOINTMENT_COLUMNS = 'id, date, start_time, status, service, total_amount, customer_email'
+
+
+class AppointmentStore:
+    """Cópia local de `appointments` (de um tenant) particionada por data (YYYY-MM-DD)"""
+
+    def __init__(self, watermark_column=SYNC_WATERMARK_COLUMN, clock=time.monotonic, tenant=None,
+                 reconcile_seconds=SYNC_RECONCILE_SECONDS if CHANGEFEED_ENABLED else 0):
+        self.tenant = tenant
+        self.reconcile_seconds = reconcile_seconds
+        self.watermark_column = watermark_column
+        self._clock = clock
+        self._partitions = {}
+        self._dates_by_id = {}
+        self._listeners = []
+        self._inflight = None
+        # Mudanças do change feed recebidas durante uma ressincronização completa
+        self._pending = None
+        self.watermark = None
+        self.last_full_sync = None
+        self.last_sync = None
+        self.stats = {"full_syncs": 0, "delta_syncs": 0, "skipped_syncs": 0, "rows_fetched": 0,
+                      "ingested": 0, "ingest_skipped": 0, "deleted": 0}
+
+    def __len__(self):
+        return len(self._dates_by_id)
+
+    @property
+    def columns(self):
+        if self.watermark_column in APPOINTMENT_COLUMNS.split(', '):
+            return APPOINTMENT_COLUMNS
+        return f"{APPOINTMENT_COLUMNS}, {self.watermark_column}"
+
+    def add_listener(self, listener):
+        """Registra um agregado incremental
+
+        `listener.apply(old, new)` é chamado a cada upsert (old=None numa
+        inserção) e `listener.reset(rows)` depois de uma ressincronização
+        completa, com todas as linhas da cópia nova.
+        """
+        self._listeners.append(listener)
+        listener.reset(self.rows())
+
+    async def sync(self):
+        """Traz as mudanças do Supabase; chamadas concorrentes compartilham a mesma
+
+        Com `reconcile_seconds` (change feed ligado) a consulta de delta é
+        pulada se a última sincronização é mais recente que isso.
+        """
+        if (self._inflight is None and self.reconcile_seconds and self.last_sync is not None
+                and self._clock() - self.last_full_sync <= SYNC_FULL_REFRESH_SECONDS
+                and self._clock() - self.last_sync < self.reconcile_seconds):
+            self.stats["skipped_syncs"] += 1
+            return 0
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._sync())
+            self._inflight.add_done_callback(self._sync_done)
+        return await asyncio.shield(self._inflight)
+
+    def _sync_done(self, task):
+        self._inflight = None
+        if not task.cancelled():
+            task.exception()
+
+    async def _sync(self):
+        full = (
+            self.watermark is None
+            or self.last_full_sync is None
+            or self._clock() - self.last_full_sync > SYNC_FULL_REFRESH_SECONDS
+        )
+        if full:
+            # Monta a cópia nova ao lado e troca no fim: leituras concorrentes
+            # continuam vendo a cópia anterior inteira durante o download
+            fresh = AppointmentStore(self.watermark_column, self._clock, self.tenant)
+            self._pending = []
+            try:
+                fetched = await fresh._consume(repository.appointments_query(tenant=self.tenant))
+                self._partitions = fresh._partitions
+                self._dates_by_id = fresh._dates_by_id
+                self.watermark = fresh.watermark
+                for listener in self._listeners:
+                    listener.reset(self.rows())
+                # A cópia nova pode ter sido lida antes das mudanças que
+                # chegaram durante o download: reaplica (as mais antigas que a
+                # linha baixada são descartadas em `ingest`)
+                pending, self._pending = self._pending, None
+                for upserts, deletes in pending:
+                    self.ingest(upserts, deletes)
+            finally:
+                self._pending = None
+            self.last_full_sync = self._clock()
+            self.stats["full_syncs"] += 1
+        else:
+            fetched = await self._consume(repository.appointments_query(tenant=self.tenant, **self._delta_filter()))
+            self.stats["delta_syncs"] += 1
+        self.last_sync = self._clock()
+        self.stats["rows_fetched"] += fetched
+        return fetched
+
+    async def _consume(self, build_query):
+        fetched = 0
+        async for page in repository.iter_pages(build_query, self.columns):
+            self.merge(page)
+            fetched += len(page)
+        return fetched
+
+    def _delta_filter(self):
+        if self.watermark_column == 'date':
+            # O watermark pode ser uma data futura (agendamentos marcados)
+            mark = min(self.watermark, datetime.now().strftime('%Y-%m-%d'))
+            since = datetime.strptime(mark, '%Y-%m-%d') - timedelta(days=SYNC_DATE_LOOKBACK_DAYS)
+            return {"since": since.strftime('%Y-%m-%d')}
+        return {"newer_than": (self.watermark_column, self.watermark)}
+
+    def merge(self, rows, advance=True):
+        """Aplica inserções/atualizações (upsert por `id`)
+
+        `advance=False` não mexe no watermark (linhas do change feed: se uma
+        mudança anterior se perdeu, a reconciliação ainda precisa buscá-la).
+        """
+        for row in rows:
+            row_id = row.get('id')
+            if row_id is None:
+                continue
+            old = self._remove(row_id)
+            date = row.get('date') or ''
+            self._partitions.setdefault(date, {})[row_id] = row
+            self._dates_by_id[row_id] = date
+            for listener in self._listeners:
+                listener.apply(old, row)
+
+            mark = row.get(self.watermark_column) if advance else None
+            if mark is not None and (self.watermark is None or mark > self.watermark):
+                self.watermark = mark
+
+    def ingest(self, upserts=(), deletes=()):
+        """Aplica mudanças do change feed: linhas inseridas/atualizadas e ids apagados
+
+        Webhooks podem chegar fora de ordem ou repetidos: uma linha com
+        watermark menor que a da cópia local é ignorada.
+        """
+        if self._pending is not None:
+            self._pending.append((upserts, deletes))
+        # Linha a linha: no mesmo lote, uma versão antiga que vem depois da
+        # nova também é descartada
+        ingested = 0
+        for row in upserts:
+            if not self._outdated(row):
+                self.merge([row], advance=False)
+                ingested += 1
+        for row_id in deletes:
+            self.delete(row_id)
+        self.stats["ingested"] += ingested
+        self.stats["ingest_skipped"] += len(upserts) - ingested
+
+    def _outdated(self, row):
+        if self.watermark_column == 'date':
+            return False
+        date = self._dates_by_id.get(row.get('id'))
+        if date is None:
+            return False
+        mark = row.get(self.watermark_column)
+        current = self._partitions[date][row['id']].get(self.watermark_column)
+        return mark is not None and current is not None and mark < current
+
+    def delete(self, row_id):
+        """Remove a linha `row_id` (se existir) e avisa os agregados"""
+        old = self._remove(row_id)
+        if old is not None:
+            self.stats["deleted"] += 1
+            for listener in self._listeners:
+                listener.apply(old, None)
+        return old
+
+    def _remove(self, row_id):
+        date = self._dates_by_id.pop(row_id, None)
+        if date is None:
+            return None
+        partition = self._partitions[date]
+        old = partition.pop(row_id)
+        if not partition:
+            del self._partitions[date]
+        return old
+
+    def partition(self, date):
+        """Linhas cuja coluna `date` é exatamente `date`"""
+        return list(self._partitions.get(date, {}).values())
+
+    def rows(self, since=None, status=None):
+        """Itera as linhas com data >= `since` e (opcionalmente) um status"""
+        for date in sorted(self._partitions):
+            if since and date < since:
+                continue
+            for row in self._partitions[date].values():
+                if status is None or row.get('status') == status:
+                    yield row
+
+    def info(self):
+        return {
+            **self.stats,
+            "rows": len(self),
+            "partitions": len(self._partitions),
+            "watermark_column": self.watermark_column,
+            "watermark": self.watermark,
+            "reconcile_seconds": self.reconcile_seconds or None,
+        }
+
@@ -0,0 +1,32 @@
+# conftest.py - Testes contra o FakeSupabase (benchmarks/fake_supabase.py)
+#
+# Uso: python -m pytest tests
+#
+# Nada fala com o Supabase: o cliente do repository é trocado pelo stand-in em
+# memória dos benchmarks. Cada teste roda as próprias coroutines com
+# asyncio.run.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import pytest  # noqa: E402
+
+import repository  # noqa: E402
+import snapshots  # noqa: E402
+from fake_supabase import FakeSupabase, synthetic_tables  # noqa: E402
+
+
+@pytest.fixture
+def tables():
+    return synthetic_tables(2000, 100, days=60)
+
+
+@pytest.fixture
+def supabase(tables, monkeypatch):
+    fake = FakeSupabase(tables)
+    monkeypatch.setattr(repository, 'supabase', fake)
+    yield fake
+    snapshots._tenants.clear()
+    snapshots.cache.invalidate()
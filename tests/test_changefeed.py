@@ -0,0 +1,75 @@
+# test_changefeed.py - Eventos do webhook aplicados na cópia local
+import asyncio
+
+import changefeed
+import snapshots
+from rollup import DailyRollup
+
+LATER = '2099-01-01T00:00:0{}+00:00'
+
+
+def event(kind, record=None, old=None):
+    return {"type": kind, "table": "appointments", "record": record, "old_record": old}
+
+
+def stored(store, row):
+    return next((r for r in store.partition(row['date']) if r['id'] == row['id']), None)
+
+
+def assert_rollup_matches(data):
+    fresh = DailyRollup(distinct='exact')
+    fresh.reset(data.store.rows())
+    assert list(data.rollup.window_totals().items()) == list(fresh.window_totals().items())
+    assert data.rollup.distinct_customers() == fresh.distinct_customers()
+
+
+def test_out_of_order_and_duplicate_events(supabase, tables):
+    row = tables['appointments'][0]
+    first = {**row, 'status': 'canceled', 'updated_at': LATER.format(1)}
+    second = {**row, 'status': 'confirmed', 'total_amount': 999.0, 'updated_at': LATER.format(2)}
+
+    async def run():
+        data = snapshots.tenant_data()
+        await data.store.sync()
+        # A versão mais nova chega antes (e duas vezes); a antiga chega depois,
+        # no mesmo lote e num lote separado
+        await changefeed.apply([event('UPDATE', second, row), event('UPDATE', second, row),
+                                event('UPDATE', first, row)])
+        await changefeed.apply([event('UPDATE', first, row)])
+        return data
+
+    data = asyncio.run(run())
+    assert stored(data.store, row) == {column: second.get(column) for column in stored(data.store, row)}
+    assert data.store.stats['ingest_skipped'] == 2
+    assert len(data.store) == len(tables['appointments'])
+    assert_rollup_matches(data)
+
+
+def test_events_during_full_resync_are_reapplied(supabase, tables):
+    changed, deleted, inserted = tables['appointments'][:3]
+    changed_now = {**changed, 'status': 'canceled', 'updated_at': LATER.format(1)}
+    inserted = {**inserted, 'id': 10**6, 'updated_at': LATER.format(1)}
+    supabase.latency = 0.01
+
+    async def run():
+        data = snapshots.tenant_data()
+        await data.store.sync()
+        data.store.last_full_sync = None
+        resync = asyncio.ensure_future(data.store.sync())
+        while data.store._pending is None:
+            await asyncio.sleep(0.001)
+        # O Supabase (FakeSupabase) ainda devolve as versões antigas: só a
+        # reaplicação dos eventos pendentes deixa a cópia nova em dia
+        await changefeed.apply([event('UPDATE', changed_now, changed), event('DELETE', old=deleted),
+                                event('INSERT', inserted)])
+        assert not resync.done()
+        await resync
+        return data
+
+    data = asyncio.run(run())
+    assert data.store.stats['full_syncs'] == 2
+    assert stored(data.store, changed)['status'] == 'canceled'
+    assert stored(data.store, deleted) is None
+    assert stored(data.store, inserted) is not None
+    assert len(data.store) == len(tables['appointments'])
+    assert_rollup_matches(data)
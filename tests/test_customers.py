@@ -0,0 +1,30 @@
+# test_customers.py - Índice por cliente mantido pela fila de mudanças
+from customers import CustomerIndex
+from sync import AppointmentStore
+
+
+def snapshot(index):
+    return {email: (round(stats.spent, 2), stats.visits, stats.last_visit) for email, stats in index.by_email.items()}
+
+
+def test_incremental_refresh_matches_full_rebuild(tables):
+    rows = tables['appointments']
+    store = AppointmentStore(watermark_column='updated_at')
+    index = CustomerIndex()
+    store.add_listener(index)
+    store.merge(rows)
+    assert index.refresh() == len(index)
+    assert index.stats['full'] == 1
+
+    store.merge([{**row, 'status': 'canceled'} for row in rows[:300:5]])
+    store.merge([{**row, 'customer_email': 'novo@example.com', 'status': 'confirmed'} for row in rows[1:300:7]])
+    for row in rows[2:300:11]:
+        store.delete(row['id'])
+    assert index.refresh() > 0
+    assert index.stats['incremental'] == 1
+
+    fresh = CustomerIndex()
+    fresh.reset(store.rows())
+    fresh.refresh()
+    assert snapshot(index) == snapshot(fresh)
+    assert index.refresh() == 0
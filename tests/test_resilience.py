@@ -0,0 +1,86 @@
+# test_resilience.py - Circuit breaker das chamadas ao Supabase
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=3, reset_seconds=10, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 9.9
+    assert not breaker.allow()
+
+    # Depois do reset: uma única chamada de teste por vez
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    # Teste falhou: abre de novo, contando o prazo a partir de agora
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 19.9
+    assert not breaker.allow()
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=1, reset_seconds=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_call_fails_fast_while_open(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'breaker', CircuitBreaker(failures=2, reset_seconds=30, clock=clock))
+    monkeypatch.setattr(resilience, 'SUPABASE_RETRIES', 1)
+    monkeypatch.setattr(resilience, 'SUPABASE_RETRY_BASE_DELAY', 0)
+    calls = []
+
+    async def failing():
+        calls.append(clock.now)
+        raise ConnectionError("sem rede")
+
+    async def working():
+        calls.append(clock.now)
+        return "ok"
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(resilience.call(failing))
+    assert len(calls) == 2 and resilience.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilience.call(working))
+    assert len(calls) == 2
+
+    clock.now = 30
+    assert asyncio.run(resilience.call(working)) == "ok"
+    assert resilience.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,77 @@
+# test_rollup.py - Rollup diário mantido incrementalmente pela cópia local
+from rollup import DailyRollup
+from sync import AppointmentStore
+
+
+def cells(rollup):
+    """{(data, serviço, status): (contagem, receita, pagos, clientes, horas)}"""
+    return {
+        (day, service, status): (cell.count, round(cell.revenue, 2), cell.paid, dict(cell.customers), dict(cell.hours))
+        for day, service, status, cell in rollup.cells()
+    }
+
+
+def rebuilt(rows):
+    rollup = DailyRollup(distinct='exact')
+    rollup.reset(rows)
+    return rollup
+
+
+def test_status_change_moves_row_between_cells(tables):
+    rows = [row for row in tables['appointments'] if row['status'] == 'confirmed'][:50]
+    store = AppointmentStore(watermark_column='updated_at')
+    rollup = DailyRollup(distinct='exact', rows_on=store.partition)
+    store.add_listener(rollup)
+    store.merge(rows)
+
+    row = rows[0]
+    key = (row['date'], row['service'])
+    confirmed = cells(rollup)[(*key, 'confirmed')]
+    store.merge([{**row, 'status': 'canceled', 'updated_at': '2099-01-01T00:00:00+00:00'}])
+
+    after = cells(rollup)
+    assert after.get((*key, 'confirmed'), (0,))[0] == confirmed[0] - 1
+    assert after[(*key, 'canceled')][:3] == (1, row['total_amount'], 1)
+    assert after[(*key, 'canceled')][3] == {row['customer_email']: 1}
+    assert after == cells(rebuilt(store.rows()))
+
+
+def test_upserts_and_deletes_match_full_rebuild(tables):
+    rows = tables['appointments'][:500]
+    store = AppointmentStore(watermark_column='updated_at')
+    rollup = DailyRollup(distinct='exact', rows_on=store.partition)
+    store.add_listener(rollup)
+    store.merge(rows)
+
+    store.merge([{**row, 'service': 'Escova', 'total_amount': 0} for row in rows[:100:3]])
+    for row in rows[1:200:7]:
+        store.delete(row['id'])
+
+    assert cells(rollup) == cells(rebuilt(store.rows()))
+
+
+def test_hll_sketch_is_rebuilt_after_removal():
+    store = AppointmentStore(watermark_column='updated_at')
+    rollup = DailyRollup(distinct='hll', rows_on=store.partition)
+    store.add_listener(rollup)
+    rows = [
+        {'id': i, 'date': '2026-01-05', 'status': 'confirmed', 'service': 'Corte de Cabelo',
+         'total_amount': 50.0, 'customer_email': email, 'updated_at': '2026-01-05T10:00:00+00:00'}
+        for i, email in enumerate(['a@example.com', 'b@example.com', 'b@example.com', 'c@example.com'])
+    ]
+    store.merge(rows)
+    assert rollup.approximate
+    assert rollup.distinct_customers(status='confirmed') == 3
+
+    # HyperLogLog não remove: o (dia, status) é marcado e refeito na leitura
+    store.delete(3)
+    store.merge([{**rows[2], 'status': 'canceled', 'updated_at': '2026-01-06T10:00:00+00:00'}])
+    assert rollup.info()['stale_sketches'] == 1
+    assert rollup.distinct_customers(status='confirmed') == 2
+    assert rollup.distinct_customers(status='canceled') == 1
+    assert rollup.info()['stale_sketches'] == 0
+
+    for row_id in (0, 1, 2):
+        store.delete(row_id)
+    assert rollup.distinct_customers() == 0
+    assert rollup.info()['sketches'] == 0